@@ -64,7 +64,8 @@ frappe.query_reports["MK Accounts Payable"] = {
             fieldname: "range",
             label: __("Ageing Range"), 
             fieldtype: "Data",
-            default: "30, 60, 90, 120"
+            default: "30, 60, 90, 120",
+            description: __("Comma separated upper bounds in days, e.g. 30, 60, 90, 120, 180")
         },
         {
             fieldname: "supplier",
@@ -104,6 +105,40 @@ frappe.query_reports["MK Accounts Payable"] = {
             fieldname: "in_party_currency",
             label: __("In Party Currency"),
             fieldtype: "Check"
+        },
+        {
+            fieldname: "open_vouchers_only",
+            label: __("Open Vouchers Only"),
+            fieldtype: "Check",
+            description: __("Load the open vouchers page by page")
+        },
+        {
+            fieldname: "page_length",
+            label: __("Page Length"),
+            fieldtype: "Int",
+            default: 500,
+            depends_on: "eval:doc.open_vouchers_only"
+        },
+        {
+            fieldname: "cash_outflow_calendar",
+            label: __("Cash Outflow Calendar"),
+            fieldtype: "Check",
+            description: __("Open outstanding per supplier by due date, from the Posting Date on")
+        },
+        {
+            fieldname: "calendar_range",
+            label: __("Calendar Range"),
+            fieldtype: "Select",
+            options: "Weekly\nMonthly",
+            default: "Weekly",
+            depends_on: "eval:doc.cash_outflow_calendar"
+        },
+        {
+            fieldname: "calendar_periods",
+            label: __("Calendar Periods"),
+            fieldtype: "Int",
+            default: 12,
+            depends_on: "eval:doc.cash_outflow_calendar"
         }
     ],
 
@@ -122,6 +157,34 @@ frappe.query_reports["MK Accounts Payable"] = {
                 company: filters.company
             });
         });
+
+        report.page.add_inner_button(__("Load More Open Vouchers"), function() {
+            let filters = report.get_values();
+            let last = report.data && report.data[report.data.length - 1];
+            if (!filters.open_vouchers_only || !last) {
+                frappe.msgprint(__("Run the report with Open Vouchers Only to load further pages"));
+                return;
+            }
+
+            frappe.call({
+                method: "erpnext.accounts.report.mk_accounts_payable.mk_accounts_payable.get_open_vouchers_page",
+                args: {
+                    filters: filters,
+                    after_posting_date: last.posting_date,
+                    after_voucher_type: last.voucher_type,
+                    after_voucher_no: last.voucher_no,
+                    after_party: last.party
+                },
+                callback: function(r) {
+                    if (!r.message || !r.message.length) {
+                        frappe.show_alert(__("All open vouchers are loaded"));
+                        return;
+                    }
+                    report.data = report.data.concat(r.message);
+                    report.datatable.appendRows(r.message);
+                }
+            });
+        });
     }
 };
 
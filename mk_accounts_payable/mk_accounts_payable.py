@@ -4,7 +4,9 @@
 from __future__ import unicode_literals
 import frappe
 from frappe import _, scrub
-from frappe.utils import getdate, nowdate, flt, cint, formatdate, cstr
+from frappe.utils import getdate, nowdate, flt, cint, formatdate, cstr, add_days, add_months
+
+from erpnext.stock.report.mk_report_utils.periods import PeriodBuckets
 
 class AccountsPayableReport:
     def __init__(self, filters=None):
@@ -44,9 +46,12 @@ class AccountsPayableReport:
         self.party_naming_by = frappe.db.get_value(
             self.filters.naming_by[0], None, self.filters.naming_by[1]
         )
+        if self.filters.get("cash_outflow_calendar"):
+            return self.get_cash_outflow_calendar()
+
         self.get_columns()
         self.get_data()
-        return self.columns, self.data
+        return self.columns, self.data, None, self.get_chart_data()
 
     def set_defaults(self):
         if not self.filters.get("company"):
@@ -59,6 +64,7 @@ class AccountsPayableReport:
         self.party_details = {}
         self.invoices = []
         self.data = []
+        self.set_ageing_ranges()
 
     def get_columns(self):
         self.columns = [            
@@ -121,85 +127,326 @@ class AccountsPayableReport:
                 "fieldtype": "Int",
                 "width": 80
             },
-            {
-                "label": _("0-30"),
-                "fieldname": "range1",
-                "fieldtype": "Currency",
-                "options": "currency",
-                "width": 100
-            },
-            {
-                "label": _("31-60"),
-                "fieldname": "range2",
+        ]
+
+        for idx, label in enumerate(self.get_range_labels(), 1):
+            self.columns.append({
+                "label": label,
+                "fieldname": f"range{idx}",
                 "fieldtype": "Currency",
                 "options": "currency",
                 "width": 100
-            },
+            })
+
+    def set_ageing_ranges(self):
+        """Upper bounds (in days) of every bucket but the last, from the Ageing Range filter"""
+        ranges = [cint(edge) for edge in cstr(self.filters.get("range") or "30, 60, 90, 120").split(",")]
+        self.ranges = sorted({edge for edge in ranges if edge > 0}) or [30, 60, 90, 120]
+
+    def get_range_labels(self):
+        lower = 0
+        labels = []
+        for upper in self.ranges:
+            labels.append(f"{lower}-{upper}")
+            lower = upper + 1
+        labels.append(f"{lower}-{_('Above')}")
+        return labels
+
+    def get_ageing_sql(self, alias):
+        """Age of a voucher and the index of its ageing bucket, computed by the database"""
+        ageing_date = {
+            "Posting Date": f"{alias}.posting_date",
+            "Supplier Invoice Date": f"COALESCE(pi.bill_date, {alias}.posting_date)",
+        }.get(self.filters.get("ageing_based_on"), f"COALESCE({alias}.due_date, {alias}.posting_date)")
+
+        age = f"DATEDIFF(%(age_as_on)s, {ageing_date})"
+        buckets = " ".join(
+            f"WHEN {age} <= {upper} THEN {idx}" for idx, upper in enumerate(self.ranges, 1)
+        )
+        return age, f"CASE {buckets} ELSE {len(self.ranges) + 1} END"
+
+    def get_supplier_invoice_join(self, alias):
+        if self.filters.get("ageing_based_on") != "Supplier Invoice Date":
+            return ""
+        return f"""LEFT JOIN `tabPurchase Invoice` pi
+            ON {alias}.voucher_type = 'Purchase Invoice' AND pi.name = {alias}.voucher_no"""
+
+    def get_party_conditions(self, alias):
+        """Supplier and Supplier Group filters, on the open vouchers `alias` joined to Supplier `s`"""
+        conditions = ""
+        if self.filters.get("supplier"):
+            conditions += f" AND {alias}.party IN %(supplier)s"
+        if self.filters.get("supplier_group"):
+            conditions += " AND s.supplier_group = %(supplier_group)s"
+        return conditions
+
+    def get_data(self):
+        # Only vouchers still outstanding on the report date are read, a page at a
+        # time when Open Vouchers Only is set
+        self.entries = self.get_open_voucher_entries(paged=self.filters.get("open_vouchers_only"))
+        self.build_data_from_entries()
+
+    def get_open_voucher_entries(self, paged=False):
+        """The open vouchers, or one keyset page of them.
+
+        Pages continue after the (posting_date, voucher_type, voucher_no, party)
+        of the last loaded row, which the balance table's index is ordered by, so
+        a page reads no further than its LIMIT. A report date in the past nets the
+        Payment Ledger first, so there the cursor only saves sending rows back.
+        """
+        age, bucket = self.get_ageing_sql("ov")
+        conditions, limit = self.get_party_conditions("ov"), ""
+        if paged:
+            limit = "LIMIT %(page_length)s"
+            if self.filters.get("after_posting_date") and self.filters.get("after_voucher_no"):
+                # The cursor is the full grouping key: a Journal Entry settling several
+                # suppliers is one open voucher per party, all sharing date and number
+                conditions += """ AND ov.posting_date >= %(after_posting_date)s
+                    AND (ov.posting_date, ov.voucher_type, ov.voucher_no, ov.party)
+                    > (%(after_posting_date)s, %(after_voucher_type)s, %(after_voucher_no)s, %(after_party)s)"""
+
+        return frappe.db.sql("""
+            SELECT
+                ov.*,
+                ov.invoice_amount - ov.outstanding as paid_amount,
+                s.supplier_group,
+                {age} as age,
+                {bucket} as bucket
+            FROM ({open_vouchers}) ov
+            LEFT JOIN `tabSupplier` s
+                ON ov.party = s.name
+            {supplier_invoice_join}
+            WHERE 1 = 1 {conditions}
+            ORDER BY ov.posting_date, ov.voucher_type, ov.voucher_no, ov.party
+            {limit}
+        """.format(
+            open_vouchers=self.get_open_voucher_sql(),
+            age=age,
+            bucket=bucket,
+            conditions=conditions,
+            limit=limit,
+            supplier_invoice_join=self.get_supplier_invoice_join("ov"),
+        ), dict(
+            self.filters,
+            age_as_on=self.age_as_on,
+            precision=cint(self.currency_precision) or 2,
+            page_length=min(cint(self.filters.get("page_length")) or 500, 5000),
+        ), as_dict=1)
+
+    def get_open_voucher_sql(self):
+        """Vouchers outstanding on the report date, with payments netted into what they settle.
+
+        MK Party Ledger Balance holds today's balance of every voucher, so up to
+        today its open rows are read through the is_open index. A report date in
+        the past has to leave out what was paid since, so Payment Ledger Entries
+        up to that date are netted instead.
+        """
+        if self.filters.report_date >= getdate(nowdate()):
+            return """
+                SELECT
+                    plb.voucher_type,
+                    plb.voucher_no,
+                    plb.party,
+                    plb.account_currency as currency,
+                    plb.posting_date,
+                    plb.due_date,
+                    plb.invoice_amount,
+                    plb.outstanding
+                FROM `tabMK Party Ledger Balance` plb
+                WHERE
+                    plb.company = %(company)s
+                    AND plb.account = %(account)s
+                    AND plb.is_open = 1
+                    AND plb.party_type = 'Supplier'
+                    AND plb.posting_date <= %(report_date)s
+            """
+
+        return """
+                SELECT
+                    ple.against_voucher_type as voucher_type,
+                    ple.against_voucher_no as voucher_no,
+                    ple.party,
+                    MAX(ple.account_currency) as currency,
+                    COALESCE(MAX(IF(ple.voucher_no = ple.against_voucher_no, ple.posting_date, NULL)),
+                        MIN(ple.posting_date)) as posting_date,
+                    MAX(IF(ple.voucher_no = ple.against_voucher_no, ple.due_date, NULL)) as due_date,
+                    SUM(IF(ple.voucher_no = ple.against_voucher_no, ple.amount_in_account_currency, 0))
+                        as invoice_amount,
+                    SUM(ple.amount_in_account_currency) as outstanding
+                FROM `tabPayment Ledger Entry` ple
+                WHERE
+                    ple.company = %(company)s
+                    AND ple.account = %(account)s
+                    AND ple.party_type = 'Supplier'
+                    AND ple.delinked = 0
+                    AND ple.posting_date <= %(report_date)s
+                GROUP BY ple.against_voucher_type, ple.against_voucher_no, ple.party
+                HAVING ROUND(outstanding, %(precision)s) != 0
+        """
+
+    def get_cash_outflow_calendar(self):
+        """Open outstanding per supplier by due date week or month, from the report date on.
+
+        The open vouchers are bucketed and summed by the database in one grouped
+        query; amounts due before the report date fall in Overdue and those past
+        the horizon in Later. Supplier rows are nested under their group subtotal.
+        """
+        weekly = self.filters.get("calendar_range") == "Weekly"
+        horizon = cint(self.filters.get("calendar_periods")) or 12
+        to_date = add_days(self.filters.report_date, 7 * horizon - 1) if weekly \
+            else add_days(add_months(self.filters.report_date, horizon), -1)
+        periods = PeriodBuckets(self.filters.report_date, to_date, "Weekly" if weekly else "Monthly")
+
+        due_date = "COALESCE(ov.due_date, ov.posting_date)"
+        entries = frappe.db.sql("""
+            SELECT
+                s.supplier_group,
+                ov.party,
+                MAX(ov.currency) as currency,
+                CASE
+                    WHEN {due_date} < %(report_date)s THEN 'overdue'
+                    WHEN {due_date} > %(to_date)s THEN 'later'
+                    ELSE {period_index}
+                END as bucket,
+                SUM(ov.outstanding) as outstanding
+            FROM ({open_vouchers}) ov
+            LEFT JOIN `tabSupplier` s
+                ON ov.party = s.name
+            WHERE 1 = 1 {conditions}
+            GROUP BY s.supplier_group, ov.party, bucket
+        """.format(
+            conditions=self.get_party_conditions("ov"),
+            due_date=due_date,
+            period_index=periods.get_index_sql(due_date),
+            open_vouchers=self.get_open_voucher_sql(),
+        ), dict(
+            self.filters,
+            to_date=to_date,
+            precision=cint(self.currency_precision) or 2,
+        ), as_dict=1)
+
+        fieldnames = ["overdue"] + [period.key for period in periods] + ["later"]
+        columns = [
             {
-                "label": _("61-90"),
-                "fieldname": "range3",
-                "fieldtype": "Currency",
-                "options": "currency",
-                "width": 100
+                "label": _("Supplier Group"),
+                "fieldname": "supplier_group",
+                "fieldtype": "Link",
+                "options": "Supplier Group",
+                "width": 160
             },
             {
-                "label": _("91-120"),
-                "fieldname": "range4",
-                "fieldtype": "Currency",
-                "options": "currency",
-                "width": 100
+                "label": _("Supplier"),
+                "fieldname": "party",
+                "fieldtype": "Link",
+                "options": "Supplier",
+                "width": 160
             },
-            {
-                "label": _("120+"),
-                "fieldname": "range5",
+        ]
+        labels = [_("Overdue")] + [period.label for period in periods] + [_("Later"), _("Total")]
+        for fieldname, label in zip(fieldnames + ["total"], labels):
+            columns.append({
+                "label": label,
+                "fieldname": fieldname,
                 "fieldtype": "Currency",
                 "options": "currency",
-                "width": 100
-            }
-        ]
+                "width": 110
+            })
 
-    def get_data(self):
-        self.entries = frappe.db.sql("""
-            SELECT 
-                ge.posting_date, 
-                ge.due_date, 
-                ge.party,
-                s.supplier_group,
-                ge.voucher_type, 
-                ge.voucher_no,
-                ge.account_currency as currency,
-                SUM(ge.debit_in_account_currency) as invoice_amount,
-                SUM(ge.credit_in_account_currency) as paid_amount
-            FROM `tabGL Entry` ge
-            LEFT JOIN `tabSupplier` s 
-                ON ge.party = s.name
-            WHERE 
-                ge.company = %(company)s 
-                AND ge.account = %(account)s
-                AND ge.party_type = 'Supplier'
-                AND ge.posting_date <= %(report_date)s
-                AND ge.is_cancelled = 0
-            GROUP BY 
-                ge.voucher_type, 
-                ge.voucher_no, 
-                ge.party,
-                ge.posting_date,
-                ge.due_date
-            ORDER BY 
-                ge.posting_date, 
-                ge.party
-        """, self.filters, as_dict=1)
+        # Supplier rows and their group subtotals are filled in the same pass
+        groups = {}
+        for entry in entries:
+            group = groups.setdefault(entry.supplier_group, {})
+            for party in (None, entry.party):
+                row = group.setdefault(party, dict.fromkeys(fieldnames + ["total"], 0.0))
+                row["currency"] = entry.currency
+                fieldname = entry.bucket if entry.bucket in ("overdue", "later") \
+                    else periods[cint(entry.bucket)].key
+                row[fieldname] += flt(entry.outstanding)
+                row["total"] += flt(entry.outstanding)
 
-        self.build_data_from_entries()
+        data = []
+        for supplier_group in sorted(groups, key=cstr):
+            rows = groups[supplier_group]
+            data.append(dict(rows.pop(None), supplier_group=supplier_group, indent=0, bold=1))
+            for party in sorted(rows, key=cstr):
+                data.append(dict(rows[party], supplier_group=supplier_group, party=party, indent=1))
+
+        chart = {
+            "data": {
+                "labels": labels[:-1],
+                "datasets": [{
+                    "name": _("Outflow"),
+                    "values": [sum(row[fieldname] for row in data if row["indent"] == 0) for fieldname in fieldnames],
+                }],
+            },
+            "type": "bar",
+            "fieldtype": "Currency",
+        } if data else None
+
+        return columns, data, None, chart
 
     def build_data_from_entries(self):
+        """Place every voucher in its bucket and total the buckets per supplier and supplier
+        group in the same pass"""
         self.data = []
+        self.party_totals = {}
+        self.group_totals = {}
+        range_fields = [f"range{idx}" for idx in range(1, len(self.ranges) + 2)]
+
         for entry in self.entries:
             row = self.prepare_row(entry)
             self.data.append(row)
 
-    def prepare_row(self, entry):
+            for totals, key in ((self.party_totals, entry.party), (self.group_totals, entry.supplier_group)):
+                total = totals.setdefault(key, dict.fromkeys(["invoiced_amount", "outstanding_amount"] + range_fields, 0.0))
+                for fieldname in total:
+                    total[fieldname] += flt(row[fieldname])
+
+        # Total rows would break the (posting_date, voucher_type, voucher_no, party) order pages continue from
+        if self.filters.get("group_by_party") and not self.filters.get("open_vouchers_only"):
+            self.add_party_total_rows()
+
+    def add_party_total_rows(self):
+        """Order the vouchers by supplier, each supplier followed by its bold total row"""
+        rows_by_party = {}
+        for row in self.data:
+            rows_by_party.setdefault(row["party"], []).append(row)
+
+        self.data = []
+        for party in sorted(rows_by_party, key=cstr):
+            self.data.extend(rows_by_party[party])
+            self.data.append(dict(
+                self.party_totals[party],
+                party=party,
+                supplier_group=rows_by_party[party][0]["supplier_group"],
+                currency=rows_by_party[party][0]["currency"],
+                bold=1,
+            ))
+
+    def get_chart_data(self):
+        """Outstanding per supplier group, stacked by ageing bucket"""
+        if not self.group_totals:
+            return None
+
+        groups = sorted(self.group_totals, key=cstr)
         return {
+            "data": {
+                "labels": [group or _("Not Set") for group in groups],
+                "datasets": [
+                    {
+                        "name": label,
+                        "values": [self.group_totals[group][f"range{idx}"] for group in groups],
+                    }
+                    for idx, label in enumerate(self.get_range_labels(), 1)
+                ],
+            },
+            "type": "bar",
+            "fieldtype": "Currency",
+            "barOptions": {"stacked": 1},
+        }
+
+    def prepare_row(self, entry):
+        row = {
             "party": entry.party,
             "supplier_group": entry.supplier_group,
             "posting_date": entry.posting_date,
@@ -208,14 +455,28 @@ class AccountsPayableReport:
             "due_date": entry.due_date,
             "invoiced_amount": entry.invoice_amount,
             "outstanding_amount": entry.invoice_amount - entry.paid_amount,
-            "age": (self.age_as_on - getdate(entry.posting_date)).days or 0,
-            "range1": entry.get("range1", 0),
-            "range2": entry.get("range2", 0),
-            "range3": entry.get("range3", 0),
-            "range4": entry.get("range4", 0),
-            "range5": entry.get("range5", 0),
+            "age": cint(entry.age),
             "currency": entry.currency
         }
+        for idx in range(1, len(self.ranges) + 2):
+            row[f"range{idx}"] = 0.0
+        row[f"range{cint(entry.bucket)}"] = row["outstanding_amount"]
+        return row
+
+@frappe.whitelist()
+def get_open_vouchers_page(filters, after_posting_date, after_voucher_type, after_voucher_no, after_party):
+    """Next page of open vouchers after the (posting_date, voucher_type, voucher_no, party)
+    of the last loaded row"""
+    frappe.has_permission("Purchase Invoice", "read", throw=True)
+    filters = frappe._dict(frappe.parse_json(filters))
+    filters.update(
+        open_vouchers_only=1,
+        after_posting_date=after_posting_date,
+        after_voucher_type=after_voucher_type,
+        after_voucher_no=after_voucher_no,
+        after_party=after_party,
+    )
+    return execute(filters)[1]
 
 def execute(filters=None):
     args = {
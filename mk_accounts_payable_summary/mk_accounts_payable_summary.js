@@ -34,6 +34,18 @@ frappe.query_reports["MK Accounts Payable Summary"] = {
                     }
                 };
             }
+        },
+        {
+            fieldname: "month_end_trend",
+            label: __("Month End Trend"),
+            fieldtype: "Check"
+        },
+        {
+            fieldname: "from_date",
+            label: __("From Date"),
+            fieldtype: "Date",
+            default: frappe.datetime.year_start(),
+            depends_on: "eval:doc.month_end_trend"
         }
     ]
 };
\ No newline at end of file
@@ -1,7 +1,13 @@
+import heapq
+
 import frappe
 from frappe import _
 from frappe.utils import flt, getdate, nowdate
 
+from erpnext.stock.report.mk_report_utils.periods import PeriodBuckets
+
+TREND_MEASURES = ("invoiced_amount", "paid_amount", "outstanding_amount", "overdue_amount")
+
 class MKAccountsPayableSummary:
     def __init__(self, filters=None):
         self.filters = frappe._dict(filters or {})
@@ -9,16 +15,17 @@ class MKAccountsPayableSummary:
         self.age_as_on = getdate(nowdate()) \
             if self.filters.report_date > getdate(nowdate()) \
             else self.filters.report_date
-        self.receivables = []  # Changed from dict to list
-        self.supplier_map = {}  # Track suppliers with index
+        self.suppliers = {}
 
     def run(self):
+        if self.filters.get("month_end_trend"):
+            return self.run_trend()
+
         self.get_columns()
+        # A fixed three queries, however many suppliers there are
         self.get_supplier_details()
         self.get_invoices()
         self.get_payments()
-        self.get_advances()
-        self.get_debit_notes()
         data = self.process_data()
         return self.columns, data
 
@@ -76,196 +83,192 @@ class MKAccountsPayableSummary:
             }
         ]
 
-    def get_supplier_details(self):
+    def get_conditions(self, supplier_field):
         conditions = ""
         if self.filters.get("supplier_group"):
-            conditions += " AND supplier_group = %(supplier_group)s"
+            conditions += " AND s.supplier_group = %(supplier_group)s"
         if self.filters.get("supplier"):
-            conditions += " AND name = %(supplier)s"
+            conditions += f" AND {supplier_field} = %(supplier)s"
+        return conditions
+
+    def get_supplier_row(self, supplier, supplier_group=None):
+        if supplier not in self.suppliers:
+            self.suppliers[supplier] = frappe._dict({
+                "supplier": supplier,
+                "supplier_group": supplier_group,
+                "advance_amount": 0.0,
+                "invoiced_amount": 0.0,
+                "paid_amount": 0.0,
+                "debit_note": 0.0,
+                "outstanding_amount": 0.0,
+                "overdue_amount": 0.0
+            })
+        return self.suppliers[supplier]
 
+    def get_supplier_details(self):
         suppliers = frappe.db.sql("""
-            SELECT name, supplier_group 
-            FROM `tabSupplier`
-            WHERE disabled = 0 {0}
-        """.format(conditions), self.filters, as_dict=1)
+            SELECT s.name, s.supplier_group
+            FROM `tabSupplier` s
+            WHERE s.disabled = 0 {0}
+        """.format(self.get_conditions("s.name")), self.filters, as_dict=1)
 
         for d in suppliers:
-            self.supplier_map[d.name] = len(self.receivables)
-            self.receivables.append(frappe._dict({
-                "party": d.name,
-                "supplier_group": d.supplier_group,
-                "invoiced_amount": 0,
-                "paid_amount": 0,
-                "outstanding_amount": 0,
-                "overdue_amount": 0,
-                "advance_amount": 0,
-                "debit_note": 0
-            }))
+            self.get_supplier_row(d.name, d.supplier_group)
 
     def get_invoices(self):
-        conditions = ""
-        if self.filters.get("supplier"):
-            conditions += " AND supplier = %(supplier)s"
-
+        """Invoices and debit notes, summed per supplier in one scan"""
         invoices = frappe.db.sql("""
-            SELECT supplier, grand_total, outstanding_amount, due_date
-            FROM `tabPurchase Invoice`
-            WHERE docstatus = 1 
-            AND company = %(company)s
-            AND posting_date <= %(report_date)s
-            AND outstanding_amount != 0
+            SELECT
+                pi.supplier,
+                s.supplier_group,
+                SUM(IF(pi.outstanding_amount != 0, pi.grand_total, 0)) as invoiced_amount,
+                SUM(IF(pi.is_return = 1, pi.grand_total, 0)) as debit_note,
+                SUM(pi.outstanding_amount) as outstanding_amount,
+                SUM(IF(pi.due_date < %(age_as_on)s, pi.outstanding_amount, 0)) as overdue_amount
+            FROM `tabPurchase Invoice` pi
+            LEFT JOIN `tabSupplier` s ON s.name = pi.supplier
+            WHERE pi.docstatus = 1 
+            AND pi.company = %(company)s
+            AND pi.posting_date <= %(report_date)s
             {0}
-        """.format(conditions), self.filters, as_dict=1)
+            GROUP BY pi.supplier, s.supplier_group
+        """.format(self.get_conditions("pi.supplier")), dict(self.filters, age_as_on=self.age_as_on), as_dict=1)
 
         for d in invoices:
-            self.append_invoice_to_receivables(d)
+            row = self.get_supplier_row(d.supplier, d.supplier_group)
+            for fieldname in ("invoiced_amount", "debit_note", "outstanding_amount", "overdue_amount"):
+                row[fieldname] += flt(d[fieldname])
 
     def get_payments(self):
-        conditions = ""
-        if self.filters.get("supplier"):
-            conditions += " AND party = %(supplier)s"
-
+        """Payments and their unallocated (advance) part, summed per supplier in one scan"""
         payments = frappe.db.sql("""
-            SELECT party as supplier, paid_amount
-            FROM `tabPayment Entry`
-            WHERE docstatus = 1 
-            AND payment_type = 'Pay'
-            AND party_type = 'Supplier'
-            AND company = %(company)s
-            AND posting_date <= %(report_date)s
+            SELECT
+                pe.party as supplier,
+                s.supplier_group,
+                SUM(pe.paid_amount) as paid_amount,
+                SUM(pe.unallocated_amount) as advance_amount
+            FROM `tabPayment Entry` pe
+            LEFT JOIN `tabSupplier` s ON s.name = pe.party
+            WHERE pe.docstatus = 1 
+            AND pe.payment_type = 'Pay'
+            AND pe.party_type = 'Supplier'
+            AND pe.company = %(company)s
+            AND pe.posting_date <= %(report_date)s
             {0}
-        """.format(conditions), self.filters, as_dict=1)
+            GROUP BY pe.party, s.supplier_group
+        """.format(self.get_conditions("pe.party")), self.filters, as_dict=1)
 
         for d in payments:
-            self.append_payment_to_receivables(d)
+            row = self.get_supplier_row(d.supplier, d.supplier_group)
+            row.paid_amount += flt(d.paid_amount)
+            row.advance_amount += flt(d.advance_amount)
 
-    def get_advances(self):
-        conditions = ""
-        if self.filters.get("supplier"):
-            conditions += " AND t1.party = %(supplier)s"
+    def process_data(self):
+        return list(self.suppliers.values())
 
-        advances = frappe.db.sql("""
-            SELECT 
-                t1.party,
-                IFNULL(t1.paid_amount, 0) as advance_amount
-            FROM `tabPayment Entry` t1
-            WHERE
-                t1.docstatus = 1 
-                AND t1.payment_type = 'Pay'
-                AND t1.party_type = 'Supplier'
-                AND t1.company = %(company)s
-                AND t1.posting_date <= %(report_date)s
-                {0}
-        """.format(conditions), self.filters, as_dict=1)
+    def run_trend(self):
+        """Outstanding and overdue per supplier at every month end up to the report date.
 
-        for advance in advances:
-            self.append_advance_to_receivables(advance)
+        The ledger is read once up to the last date and swept in posting date
+        order; at each month end the running per supplier figures are copied
+        into that date's column group, so N dates cost one scan instead of N.
+        """
+        if not self.filters.get("from_date"):
+            frappe.throw(_("From Date is required for the month end trend"))
 
-    def get_debit_notes(self):
-        conditions = ""
-        if self.filters.get("supplier"):
-            conditions += " AND supplier = %(supplier)s"
+        self.periods = PeriodBuckets(self.filters.from_date, self.filters.report_date, "Monthly")
+        self.get_trend_columns()
+        self.get_supplier_details()
+        self.sweep_ledger_entries(self.get_ledger_entries())
+        return self.columns, self.process_data()
+
+    def get_trend_columns(self):
+        self.get_columns()
+        self.columns = self.columns[:2]
+        labels = dict(zip(TREND_MEASURES, (_("Invoiced"), _("Paid"), _("Outstanding"), _("Overdue"))))
+        for period in self.periods:
+            for fieldname, label in labels.items():
+                self.columns.append({
+                    "label": f"{label} ({period.label})",
+                    "fieldname": f"{period.key}_{fieldname}",
+                    "fieldtype": "Currency",
+                    "width": 120
+                })
 
-        debit_notes = frappe.db.sql("""
-            SELECT supplier, grand_total
-            FROM `tabPurchase Invoice`
-            WHERE docstatus = 1 
-            AND is_return = 1
-            AND company = %(company)s
-            AND posting_date <= %(report_date)s
+    def get_ledger_entries(self):
+        """Every payables ledger movement up to the report date, oldest first.
+
+        Payment Ledger Entry ties each movement to the voucher it settles, which
+        is what lets the sweep know how much of each invoice was open (and
+        overdue) on a past date. Amounts are positive for invoices.
+        """
+        return frappe.db.sql("""
+            SELECT
+                ple.party as supplier,
+                s.supplier_group,
+                ple.posting_date,
+                ple.voucher_type,
+                ple.voucher_no,
+                ple.against_voucher_type,
+                ple.against_voucher_no,
+                ple.due_date,
+                ple.amount
+            FROM `tabPayment Ledger Entry` ple
+            LEFT JOIN `tabSupplier` s ON s.name = ple.party
+            WHERE ple.company = %(company)s
+            AND ple.party_type = 'Supplier'
+            AND ple.delinked = 0
+            AND ple.posting_date <= %(report_date)s
             {0}
-        """.format(conditions), self.filters, as_dict=1)
+            ORDER BY ple.posting_date, ple.creation
+        """.format(self.get_conditions("ple.party")), self.filters, as_dict=1)
 
-        for d in debit_notes:
-            self.append_note_to_receivables(d)
+    def sweep_ledger_entries(self, entries):
+        # voucher -> [supplier, outstanding, is_overdue]
+        vouchers = {}
+        due_dates = []
+        running = {}
+        position = 0
 
-    def append_invoice_to_receivables(self, invoice):
-        if invoice.party not in self.supplier_map:
-            idx = len(self.receivables)
-            self.supplier_map[invoice.party] = idx
-            self.receivables.append(frappe._dict({
-                "party": invoice.party,
-                "invoiced_amount": 0.0,
-                "paid_amount": 0.0,
-                "credit_note_amount": 0.0,
-                "advance_amount": 0.0,
-                "outstanding_amount": 0.0,
-                "overdue_amount": 0.0
-            }))
-        
-        idx = self.supplier_map[invoice.party]
-        entry = self.receivables[idx]
-        entry.invoiced_amount += flt(invoice.invoice_amount or 0.0)
-        entry.outstanding_amount += flt(invoice.outstanding_amount or 0.0)
-        if getdate(invoice.due_date) < self.age_as_on:
-            entry.overdue_amount += flt(invoice.outstanding_amount or 0.0)
+        for period in self.periods:
+            # Overdue is judged as on the month end, or today for a future report date
+            as_on = min(period.end_date, self.age_as_on)
 
-    def append_note_to_receivables(self, note):
-        if note.supplier not in self.supplier_map:
-            idx = len(self.receivables)
-            self.supplier_map[note.supplier] = idx
-            self.receivables.append(frappe._dict({
-                "party": note.supplier,
-                "invoiced_amount": 0,
-                "paid_amount": 0, 
-                "credit_note_amount": 0,
-                "advance_amount": 0,
-                "outstanding_amount": 0,
-                "overdue_amount": 0
-            }))
-        
-        idx = self.supplier_map[note.supplier]
-        self.receivables[idx].credit_note_amount += flt(note.grand_total)
+            while position < len(entries) and entries[position].posting_date <= period.end_date:
+                entry = entries[position]
+                position += 1
 
-    def append_advance_to_receivables(self, advance):
-        if advance.party not in self.supplier_map:
-            idx = len(self.receivables)
-            self.supplier_map[advance.party] = idx
-            self.receivables.append(frappe._dict({
-                "party": advance.party,
-                "invoiced_amount": 0.0,
-                "paid_amount": 0.0,
-                "credit_note_amount": 0.0, 
-                "advance_amount": 0.0,
-                "outstanding_amount": 0.0,
-                "overdue_amount": 0.0
-            }))
-        
-        idx = self.supplier_map[advance.party]
-        self.receivables[idx].advance_amount += flt(advance.advance_amount or 0.0)
+                if entry.supplier not in running:
+                    self.get_supplier_row(entry.supplier, entry.supplier_group)
+                    running[entry.supplier] = dict.fromkeys(TREND_MEASURES, 0.0)
+                totals = running[entry.supplier]
+                voucher_key = (entry.against_voucher_type, entry.against_voucher_no)
+                voucher = vouchers.setdefault(voucher_key, [entry.supplier, 0.0, False])
+                amount = flt(entry.amount)
 
-    def append_payment_to_receivables(self, payment):
-        if payment.party not in self.supplier_map:
-            idx = len(self.receivables)
-            self.supplier_map[payment.party] = idx
-            self.receivables.append(frappe._dict({
-                "party": payment.party,
-                "invoiced_amount": 0.0,
-                "paid_amount": 0.0,
-                "credit_note_amount": 0.0,
-                "advance_amount": 0.0,
-                "outstanding_amount": 0.0,
-                "overdue_amount": 0.0
-            }))
-        
-        idx = self.supplier_map[payment.party]
-        self.receivables[idx].paid_amount += flt(payment.paid_amount or 0.0)
+                if entry.voucher_no == entry.against_voucher_no:
+                    if entry.voucher_type == "Purchase Invoice" and amount > 0:
+                        totals["invoiced_amount"] += amount
+                    if entry.due_date:
+                        heapq.heappush(due_dates, (entry.due_date, voucher_key))
+                if entry.voucher_type == "Payment Entry":
+                    totals["paid_amount"] -= amount
 
-    def process_data(self):
-        data = []
-        for receivable in self.receivables:
-            row = {
-                "supplier_group": frappe.get_value("Supplier", receivable.party, "supplier_group"),
-                "supplier": receivable.party,
-                "advance_amount": receivable.advance_amount,  # Ensure this matches the field name
-                "invoiced_amount": receivable.invoiced_amount,
-                "paid_amount": receivable.paid_amount,
-                "debit_note": receivable.credit_note_amount,
-                "outstanding_amount": receivable.outstanding_amount,
-                "overdue_amount": receivable.overdue_amount
-            }
-            data.append(row)
-        return data
+                totals["outstanding_amount"] += amount
+                voucher[1] += amount
+                if voucher[2]:
+                    totals["overdue_amount"] += amount
+
+            while due_dates and due_dates[0][0] < as_on:
+                voucher = vouchers[heapq.heappop(due_dates)[1]]
+                if not voucher[2]:
+                    voucher[2] = True
+                    running[voucher[0]]["overdue_amount"] += voucher[1]
+
+            for supplier, row in self.suppliers.items():
+                totals = running.get(supplier)
+                for fieldname in TREND_MEASURES:
+                    row[f"{period.key}_{fieldname}"] = totals[fieldname] if totals else 0.0
 
 def execute(filters=None):
     return MKAccountsPayableSummary(filters).run()
\ No newline at end of file
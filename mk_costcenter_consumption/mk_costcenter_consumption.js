@@ -30,7 +30,78 @@ frappe.query_reports["MK Costcenter Consumption"] = {
 			options: "Item Group",
 			width: 100,
 		},
+		{
+			label: __("Top N Cost Centers"),
+			fieldname: "top_n_cost_centers",
+			fieldtype: "Int",
+			description: __("Fold the remaining cost centers into an Others column"),
+		},
 	],
 
+	formatter: function(value, row, column, data, default_formatter) {
+		value = default_formatter(value, row, column, data);
+		if (data && column.fieldtype == "Currency" && !["total", "other_cost_centers"].includes(column.fieldname)
+			&& data[column.fieldname]) {
+			value = `<a class="mk-pivot-cell" data-item-group="${encodeURIComponent(data.item_group)}"
+				data-cost-center="${encodeURIComponent(column.fieldname)}">${value}</a>`;
+		}
+		return value;
+	},
+
+	onload: function(report) {
+		report.page.wrapper.on("click", ".mk-pivot-cell", function() {
+			frappe.query_reports["MK Costcenter Consumption"].show_cell_lines(
+				report,
+				decodeURIComponent($(this).attr("data-item-group")),
+				decodeURIComponent($(this).attr("data-cost-center"))
+			);
+		});
+	},
+
+	show_cell_lines: function(report, item_group, cost_center) {
+		let filters = report.get_values();
+		let dialog = new frappe.ui.Dialog({
+			title: __("{0} / {1}", [frappe.utils.escape_html(item_group), frappe.utils.escape_html(cost_center)]),
+			size: "extra-large",
+			fields: [{ fieldname: "lines", fieldtype: "HTML" }],
+			primary_action_label: __("Load More"),
+			primary_action: () => load_page(),
+		});
+		let cursor = {};
+		let rows = [];
+
+		let load_page = () => {
+			frappe.call({
+				method: "erpnext.stock.report.mk_costcenter_consumption.mk_costcenter_consumption.get_pivot_cell_lines",
+				args: Object.assign({
+					item_group: item_group,
+					cost_center: cost_center,
+					from_date: filters.from_date,
+					to_date: filters.to_date,
+					company: filters.company,
+					warehouse: filters.warehouse,
+				}, cursor),
+				callback: function(r) {
+					rows = rows.concat(r.message.lines);
+					cursor = r.message.next_cursor || {};
+					dialog.get_primary_btn().toggle(!!r.message.next_cursor);
+					dialog.fields_dict.lines.$wrapper.html(`
+						<table class="table table-bordered">
+							<tr><th>${__("Voucher No")}</th><th>${__("Posting Date")}</th><th>${__("Item")}</th>
+								<th>${__("Warehouse")}</th><th>${__("Qty")}</th><th>${__("Amount")}</th></tr>
+							${rows.map(d => `<tr>
+								<td><a href="/app/stock-entry/${encodeURIComponent(d.voucher_no)}">${frappe.utils.escape_html(d.voucher_no)}</a></td>
+								<td>${frappe.datetime.str_to_user(d.posting_date)}</td>
+								<td>${frappe.utils.escape_html(d.item_code)}</td><td>${frappe.utils.escape_html(d.warehouse || "")}</td>
+								<td>${format_number(d.qty)}</td><td>${format_currency(d.amount)}</td>
+							</tr>`).join("")}
+						</table>`);
+				}
+			});
+		};
+
+		load_page();
+		dialog.show();
+	},
 
 };
\ No newline at end of file
@@ -1,39 +1,106 @@
 import frappe
 from frappe import _, scrub
-from frappe.utils import flt
+from frappe.utils import cint, flt
 from frappe.query_builder import DocType, Field
 from frappe.query_builder.functions import Sum
-from frappe.utils.nestedset import get_descendants_of
+
+from erpnext.stock.report.mk_report_utils.pivot import SparsePivot, get_top_columns
+from erpnext.stock.report.mk_report_utils.tree import filter_subtree_rows, join_subtree
+
+OTHER_COST_CENTERS = "other_cost_centers"
 
 def execute(filters=None):
     if not filters:
         filters = {}
     return CostAnalytics(filters).run()
 
+@frappe.whitelist()
+def get_pivot_cell_lines(
+    item_group, cost_center, from_date, to_date, company=None, warehouse=None,
+    after_posting_date=None, after_name=None, page_length=100
+):
+    """Return the Stock Entry Detail lines behind one cell of the consumption pivot.
+
+    The lines are filtered exactly like the pivot query and paged by the
+    (posting_date, detail name) keyset, so each page is an index range scan
+    rather than an OFFSET over the whole issue history.
+    """
+    frappe.has_permission("Stock Entry", "read", throw=True)
+    if cost_center == OTHER_COST_CENTERS:
+        frappe.throw(_("Drill down is only available for individual cost centers"))
+
+    page_length = min(cint(page_length) or 100, 500)
+    sed = DocType("Stock Entry Detail")
+    se = DocType("Stock Entry")
+    item = DocType("Item")
+
+    query = (
+        frappe.qb.from_(sed)
+        .inner_join(se)
+        .on(sed.parent == se.name)
+        .inner_join(item)
+        .on(sed.item_code == item.name)
+        .select(
+            se.name.as_("voucher_no"),
+            se.posting_date,
+            sed.name,
+            sed.item_code,
+            item.item_group,
+            sed.s_warehouse.as_("warehouse"),
+            sed.cost_center,
+            sed.qty,
+            sed.stock_uom,
+            sed.valuation_rate,
+            sed.amount,
+        )
+        .where(
+            (se.docstatus == 1)
+            & (se.purpose == "Material Issue")
+            & (sed.cost_center == cost_center)
+            & (se.posting_date.between(from_date, to_date))
+        )
+        .orderby(se.posting_date)
+        .orderby(sed.name)
+        .limit(page_length + 1)
+    )
+    query = join_subtree(query, item.item_group, "Item Group", item_group)
+
+    if company:
+        query = query.where(se.company == company)
+    if warehouse:
+        query = query.where(sed.s_warehouse == warehouse)
+    if after_posting_date and after_name:
+        query = query.where(
+            (se.posting_date > after_posting_date)
+            | ((se.posting_date == after_posting_date) & (sed.name > after_name))
+        )
+
+    lines = query.run(as_dict=True)
+    has_more = len(lines) > page_length
+    lines = lines[:page_length]
+
+    return {
+        "lines": lines,
+        "next_cursor": {
+            "after_posting_date": lines[-1].posting_date,
+            "after_name": lines[-1].name,
+        } if has_more else None,
+    }
+
 class CostAnalytics(object):
     def __init__(self, filters=None):
         self.filters = frappe._dict(filters or {})
         self.filters.parent_costcenter = self.filters.get("parent_costcenter") or "M K One Construction - MKB"
-        self.descendant_costcenters = get_descendants_of("Cost Center", self.filters.parent_costcenter, ignore_permissions=True)
         
     def run(self):
-        self.get_columns()
         self.get_data()
+        self.get_columns()
         skip_total_row = True  # Set to True to avoid totals row
 
         if self.filters.get("item_group"):
-            item_group_data = frappe.db.get_value("Item Group", 
-                self.filters.get("item_group"), ["lft", "rgt"], as_dict=1)
-            if item_group_data:
-                # Get all descendant item groups
-                descendant_groups = frappe.db.sql("""
-                    SELECT name FROM `tabItem Group` 
-                    WHERE lft >= %s AND rgt <= %s
-                """, (item_group_data.lft, item_group_data.rgt), as_dict=1)
-                allowed_groups = [d.name for d in descendant_groups]
-                self.filtered_data = [d for d in self.data if d.get("item_group") in allowed_groups]
-            else:
-                self.filtered_data = []
+            self.filtered_data = filter_subtree_rows(
+                self.data, self.group_entries, self.filters.item_group, "item_group"
+            )
         else:
             self.filtered_data = self.data
 
@@ -50,10 +117,10 @@ class CostAnalytics(object):
                 "width": 200
             }
         ]
-        self.get_active_costcenters()
         for costcenter in self.costcenters:
+            label = _("Others") if costcenter == OTHER_COST_CENTERS else _(costcenter)
             self.columns.append(
-                {"label": _(costcenter.cost_center), "fieldname": costcenter.cost_center, "fieldtype": "Currency", "width": 120}
+                {"label": label, "fieldname": costcenter, "fieldtype": "Currency", "width": 120}
             )
         self.columns.append(
             {"label": _("Total"), "fieldname": "total", "fieldtype": "Currency", "width": 120}
@@ -63,32 +130,6 @@ class CostAnalytics(object):
         self.get_issue_transactions_based_on_costcenter()
         self.get_rows_by_group()
 
-    def get_active_costcenters(self):
-        se = DocType("Stock Entry")
-        sed = DocType("Stock Entry Detail")
-        query = (
-            frappe.qb.from_(sed)
-            .join(se)
-            .on(se.name == sed.parent)
-            .select(sed.cost_center)
-            .distinct()
-            .where(
-                (se.docstatus == 1)
-                & (se.purpose == "Material Issue")
-                & (sed.cost_center.isin(self.descendant_costcenters))
-            )
-            .orderby(sed.cost_center)
-        )
-
-        if self.filters.get("from_date"):
-            query = query.where(se.posting_date >= self.filters.from_date)
-        if self.filters.get("to_date"):
-            query = query.where(se.posting_date <= self.filters.to_date)
-        if self.filters.get("warehouse"):
-            query = query.where(sed.s_warehouse == self.filters.warehouse)
-
-        self.costcenters = query.run(as_dict=True)
-
     def get_issue_transactions_based_on_costcenter(self):
         sed = DocType("Stock Entry Detail")
         se = DocType("Stock Entry")
@@ -104,10 +145,12 @@ class CostAnalytics(object):
             .where(
                 (se.docstatus == 1)
                 & (se.purpose == "Material Issue")
-                & (sed.cost_center.isin(self.descendant_costcenters))
             )
             .groupby(item.item_group, sed.cost_center)
         )
+        query = join_subtree(
+            query, sed.cost_center, "Cost Center", self.filters.parent_costcenter, include_root=False
+        )
 
         if self.filters.get("company"):
             query = query.where(se.company == self.filters.company)
@@ -125,26 +168,33 @@ class CostAnalytics(object):
         self.get_costcenter_data()
         out = []
 
-        for d in reversed(self.group_entries):
+        for d in self.group_entries:
+            cells = self.costcenter_data.row(d.name)
+            if not cells:
+                continue
+
             row = {"item_group": d.name, "indent": self.depth_map.get(d.name)}
-            total = 0
-            for costcenter in self.costcenters:
-                amount = flt(self.costcenter_data.get(d.name, {}).get(costcenter.cost_center, 0.0))
-                row[costcenter.cost_center] = amount
-                if d.parent:
-                    self.costcenter_data.setdefault(d.parent, frappe._dict()).setdefault(costcenter.cost_center, 0.0)
-                    self.costcenter_data[d.parent][costcenter.cost_center] += amount
-                total += amount
-            row["total"] = total
-            out = [row] + out
+            row.update(cells)
+            row["total"] = sum(cells.values())
+            out.append(row)
 
         self.data = out
 
     def get_costcenter_data(self):
-        self.costcenter_data = frappe._dict()
+        self.costcenter_data = SparsePivot()
         for d in self.entries:
-            self.costcenter_data.setdefault(d.item_group, frappe._dict()).setdefault(d.cost_center, 0.0)
-            self.costcenter_data[d.item_group][d.cost_center] += flt(d.amount)
+            self.costcenter_data.add(d.item_group, d.cost_center, d.amount)
+
+        # Pick the columns on leaf totals, fold the tail and only then roll up,
+        # so the rollup walks the folded (narrower) rows
+        totals = self.costcenter_data.column_totals()
+        top_costcenters = get_top_columns(totals, cint(self.filters.get("top_n_cost_centers")))
+        self.costcenters = sorted(top_costcenters)
+        if len(top_costcenters) < len(totals):
+            self.costcenter_data.fold_columns(top_costcenters, OTHER_COST_CENTERS)
+            self.costcenters.append(OTHER_COST_CENTERS)
+
+        self.costcenter_data.rollup(self.group_entries)
 
     def get_groups(self):
         parent = "parent_item_group"
@@ -171,20 +221,14 @@ class CostAnalytics(object):
         # Get cost center labels excluding first (Item Group) and last (Total) columns
         labels = [d.get("label") for d in self.columns[1:-1]]
 
-        # Calculate total for each cost center
-        period_totals = []
-        for cost_center in labels:
-            if self.filters.get("item_group"):
-                # Get the maximum indent level in the filtered data to identify leaf nodes
-                max_indent = max((row.get("indent", 0) for row in self.filtered_data), default=0)
-                # Only sum leaf nodes (rows with max indent) to avoid double counting
-                leaf_data = [row for row in self.filtered_data if row.get("indent", 0) == max_indent]
-                total = sum(flt(row.get(cost_center, 0)) for row in leaf_data)
-            else:
-                # When no item_group filter, use root level rows as before
-                root_level_data = [row for row in self.filtered_data if row.get("indent", 0) == 0]
-                total = sum(flt(row.get(cost_center, 0)) for row in root_level_data)
-            period_totals.append(total)
+        if self.filters.get("item_group"):
+            # The selected group already holds the rolled up amounts of its subtree
+            totals = self.costcenter_data.row(self.filters.item_group)
+        else:
+            root_groups = [d.name for d in self.group_entries if not d.parent]
+            totals = self.costcenter_data.column_totals(root_groups)
+
+        period_totals = [flt(totals.get(costcenter)) for costcenter in self.costcenters]
 
         datasets = [{
             "name": _("Total Consumption"),
@@ -1,10 +1,10 @@
 import frappe
 from frappe import _, scrub
-from frappe.utils import add_days, add_to_date, flt, getdate
+from frappe.utils import flt
 from frappe.query_builder import DocType, Field
-from erpnext.accounts.utils import get_fiscal_year
 from frappe.utils.nestedset import get_descendants_of
-from dateutil.relativedelta import relativedelta, MO
+
+from erpnext.stock.report.mk_report_utils.periods import PeriodBuckets
 
 def execute(filters=None):
     report = PaymentAnalytics(filters)
@@ -26,8 +26,6 @@ class PaymentAnalytics:
     def __init__(self, filters=None):
         self.filters = frappe._dict(filters or {})
         self.date_field = "posting_date"
-        self.months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
-                      "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
         self.data = []
         self.columns = []
         self.filtered_data = [] 
@@ -35,7 +33,7 @@ class PaymentAnalytics:
         self.supplier_groups = []
         self.entries = []
         self.payment_periodic_data = frappe._dict()
-        self.periodic_daterange = []
+        self.periods = []
 
     def validate_filters(self):
         if not self.filters.get("company"):
@@ -50,34 +48,12 @@ class PaymentAnalytics:
             self.filters.range = "Monthly"
 
     def get_period_date_ranges(self):
-        from_date, to_date = getdate(self.filters.from_date), getdate(self.filters.to_date)
-
-        if self.filters.range == "Weekly":
-            from_date = from_date + relativedelta(weekday=MO(-1))
-            self.periodic_daterange = []
-            while from_date <= to_date:
-                self.periodic_daterange.append(min(add_days(from_date, 6), to_date))
-                from_date = add_days(from_date, 7)
-        else:
-            # Monthly, Quarterly, or Yearly
-            increment = {
-                "Monthly": 1,
-                "Quarterly": 3,
-                "Yearly": 12
-            }.get(self.filters.range, 1)
-
-            if self.filters.range in ["Monthly", "Quarterly"]:
-                from_date = from_date.replace(day=1)
-            elif self.filters.range == "Yearly":
-                from_date = get_fiscal_year(from_date, company=self.filters.company)[1]
-
-            self.periodic_daterange = []
-            while from_date <= to_date:
-                period_end = add_to_date(from_date, months=increment, days=-1)
-                if period_end > to_date:
-                    period_end = to_date
-                self.periodic_daterange.append(period_end)
-                from_date = add_days(period_end, 1)
+        self.periods = PeriodBuckets(
+            self.filters.from_date,
+            self.filters.to_date,
+            self.filters.range,
+            company=self.filters.company,
+        )
 
     def get_columns(self):
         self.columns = [{
@@ -88,8 +64,7 @@ class PaymentAnalytics:
             "width": 200
         }]
 
-        for end_date in self.periodic_daterange:
-            period = self.get_period(end_date)
+        for period in self.periods.labels:
             self.columns.append({
                 "label": _(period),
                 "fieldname": scrub(period),
@@ -144,8 +119,7 @@ class PaymentAnalytics:
         for group in sorted(self.supplier_groups):
             row = {"supplier_group": group}
             total = 0
-            for end_date in self.periodic_daterange:
-                period = self.get_period(end_date)
+            for period in self.periods.labels:
                 amount = flt(self.payment_periodic_data.get(group, {}).get(period, 0.0))
                 row[scrub(period)] = amount
                 total += amount
@@ -160,26 +134,11 @@ class PaymentAnalytics:
         for d in self.entries:
             if not d.posting_date:
                 continue
-            period = self.get_period(d.posting_date)
+            period = self.periods.label(d.posting_date)
             self.payment_periodic_data.setdefault(d.supplier_group, frappe._dict())
             self.payment_periodic_data[d.supplier_group][period] = \
                 self.payment_periodic_data[d.supplier_group].get(period, 0.0) + flt(d.amount)
 
-    def get_period(self, posting_date):
-        if isinstance(posting_date, str):
-            posting_date = getdate(posting_date)
-
-        if self.filters.range == "Weekly":
-            period = _("Week {0} {1}").format(posting_date.isocalendar()[1], posting_date.year)
-        elif self.filters.range == "Monthly":
-            period = _(self.months[posting_date.month - 1]) + " " + str(posting_date.year)
-        elif self.filters.range == "Quarterly":
-            quarter = ((posting_date.month - 1) // 3) + 1
-            period = _("Quarter {0} {1}").format(quarter, posting_date.year)
-        else:
-            period = str(get_fiscal_year(posting_date, company=self.filters.company)[0])
-        return period
-
     def get_supplier_groups(self):
         if not self.entries:
             return
@@ -36,6 +36,12 @@ frappe.query_reports["MK GRN Register"] = {
 			"fieldtype": "Link",
                         "options": "Warehouse",
 			"reqd": 0
+		},
+		{
+			"fieldname": "allocate_taxes",
+			"label": __("Allocate Taxes to Lines"),
+			"fieldtype": "Check",
+			"description": __("Split receipt taxes and charges across lines by amount")
 		}
     ]
 }
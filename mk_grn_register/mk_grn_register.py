@@ -98,18 +98,29 @@ def execute(filters=None):
     if not filters:
         filters = {}
 
-    conditions = []
-    if filters.get("warehouse"):
-        conditions.append("pri.warehouse = %(warehouse)s")
+    receipt_conditions = []
     if filters.get("from_date"):
-        conditions.append("pr.posting_date >= %(from_date)s")
+        receipt_conditions.append("pr.posting_date >= %(from_date)s")
     if filters.get("to_date"):
-        conditions.append("pr.posting_date <= %(to_date)s")
+        receipt_conditions.append("pr.posting_date <= %(to_date)s")
+
+    conditions = list(receipt_conditions)
+    if filters.get("warehouse"):
+        conditions.insert(0, "pri.warehouse = %(warehouse)s")
 
     conditions = " AND ".join(conditions)
     if conditions:
         conditions = "AND " + conditions
 
+    receipt_conditions = " AND ".join(receipt_conditions)
+    if receipt_conditions:
+        receipt_conditions = "AND " + receipt_conditions
+
+    # Header taxes repeat on every line unless allocated by the line's share of the item total
+    share = "pri.amount / NULLIF(pr.total, 0)" if filters.get("allocate_taxes") else "1"
+
+    # Taxes are summed once per receipt in the derived table and joined to its lines,
+    # instead of three correlated subqueries evaluated for every line
     sql = """
         SELECT 
             pr.posting_date as date,
@@ -123,33 +134,34 @@ def execute(filters=None):
             pri.qty,
             pri.rate,
             pri.amount,
-            COALESCE(
-                (SELECT SUM(tax_amount) 
-                FROM `tabPurchase Taxes and Charges` 
-                WHERE parent = pri.parent 
-                AND charge_type IN ('On Net Total', 'On Previous Row Total')),
-                0
-            ) as tax_amount,
-            COALESCE(
-                (SELECT SUM(tax_amount) 
-                FROM `tabPurchase Taxes and Charges` 
-                WHERE parent = pri.parent 
-                AND charge_type = 'Actual'),
-                0
-            ) as charges,
-            pri.amount + 
-            COALESCE((SELECT SUM(tax_amount) 
-                    FROM `tabPurchase Taxes and Charges` 
-                    WHERE parent = pri.parent), 0
-            ) as gross_amount
+            COALESCE(ptc.tax_amount * {share}, 0) as tax_amount,
+            COALESCE(ptc.charges * {share}, 0) as charges,
+            pri.amount + COALESCE(ptc.total_taxes * {share}, 0) as gross_amount
         FROM 
             `tabPurchase Receipt Item` pri
             INNER JOIN `tabPurchase Receipt` pr ON pr.name = pri.parent
+            LEFT JOIN (
+                SELECT
+                    ptc.parent,
+                    SUM(IF(ptc.charge_type IN ('On Net Total', 'On Previous Row Total'), ptc.tax_amount, 0))
+                        as tax_amount,
+                    SUM(IF(ptc.charge_type = 'Actual', ptc.tax_amount, 0)) as charges,
+                    SUM(ptc.tax_amount) as total_taxes
+                FROM `tabPurchase Taxes and Charges` ptc
+                INNER JOIN `tabPurchase Receipt` pr ON pr.name = ptc.parent
+                WHERE ptc.parenttype = 'Purchase Receipt'
+                    AND pr.docstatus = 1
+                    {receipt_conditions}
+                GROUP BY ptc.parent
+            ) ptc ON ptc.parent = pri.parent
         WHERE 
             pri.docstatus = 1 
             {conditions}
     """
 
-    data = frappe.db.sql(sql.format(conditions=conditions), filters, as_dict=1)
+    data = frappe.db.sql(
+        sql.format(conditions=conditions, receipt_conditions=receipt_conditions, share=share),
+        filters, as_dict=1
+    )
 
     return columns, data
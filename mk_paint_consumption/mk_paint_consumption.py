@@ -2,10 +2,8 @@ from __future__ import unicode_literals
 import frappe
 
 def execute(filters=None):
-    print("Executing report...")
     columns = get_columns()
     data = get_data(filters)
-    print(f"Found {len(data)} rows")
     return columns, data
 
 def get_columns():
@@ -77,9 +75,6 @@ def get_data(filters):
     conditions = get_conditions(filters)
     paint_group = frappe.get_doc("Item Group", "Paints")
     
-    # Debug print
-    print(f"Paint group lft: {paint_group.lft}, rgt: {paint_group.rgt}")
-    
     params = {
         "lft": paint_group.lft,
         "rgt": paint_group.rgt,
@@ -95,9 +90,6 @@ def get_data(filters):
         ORDER BY lft
     """, params, as_dict=1)
 
-    # Debug print
-    print("Found item groups:", [ig.name for ig in item_groups])
-
     # Build indent map
     indent_map = {}
     for ig in item_groups:
@@ -107,9 +99,6 @@ def get_data(filters):
             level += 1
             parent = frappe.db.get_value("Item Group", parent, "parent_item_group")
         indent_map[ig.name] = level
-        
-    # Debug print
-    print("Indent map:", indent_map)
 
     # Get stock entries with modified query
     stock_entries = frappe.db.sql("""
@@ -134,17 +123,9 @@ def get_data(filters):
         ORDER BY ig.lft, se_item.item_code
     """.format(conditions=conditions), params, as_dict=1)
 
-    # Debug print
-    print("Found stock entries:", len(stock_entries))
-
     # Process data with indentation
     for row in stock_entries:
-        # Debug print for each row
-        print(f"Processing row: {row.item_group}")
-        
         indent = indent_map.get(row.item_group, 0)
-        # Debug indent level
-        print(f"Indent level: {indent}")
         
         formatted_row = [
             row.posting_date,
@@ -157,13 +138,9 @@ def get_data(filters):
             row.stock_uom,
             row.value
         ]
-        # Debug formatted row
-        print(f"Formatted row: {formatted_row}")
         
         data.append(formatted_row)
 
-    # Final debug print
-    print(f"Total rows processed: {len(data)}")
     return data
 
 def get_conditions(filters):
@@ -0,0 +1,90 @@
+import frappe
+from frappe.model.document import Document
+from frappe.utils import cint
+
+KEY_FIELDS = ("company", "account", "party_type", "party", "voucher_type", "voucher_no")
+
+
+class MKPartyLedgerBalance(Document):
+    pass
+
+
+def on_doctype_update():
+    # Covers the open voucher read and its keyset order, so pages stop at LIMIT
+    frappe.db.add_index(
+        "MK Party Ledger Balance",
+        ["company", "account", "is_open", "posting_date", "voucher_type", "voucher_no", "party"],
+        "company_account_is_open_posting_date",
+    )
+    frappe.db.add_index("MK Party Ledger Balance", ["voucher_no", "voucher_type"])
+
+
+def update_party_ledger_balance(doc, method=None):
+    """Payment Ledger Entry on_submit: recompute the vouchers the entry touches.
+
+    Payment Ledger Entries are only posted for receivable and payable accounts,
+    and cancelling or reconciling a voucher submits new (delinked or re-pointed)
+    entries as well, so this one hook follows every change to an outstanding.
+    Only the entry's against voucher and, when it settles another voucher, its
+    own voucher (whose unallocated balance it may have moved) are recomputed.
+    """
+    if doc.account_type != "Payable":
+        return
+
+    against_vouchers = {(doc.against_voucher_type, doc.against_voucher_no), (doc.voucher_type, doc.voucher_no)}
+    rebuild_party_ledger_balance(against_vouchers=[d for d in against_vouchers if d[1]])
+
+
+def rebuild_party_ledger_balance(company=None, against_vouchers=None):
+    """Recompute balance rows from Payment Ledger Entry, for a company, some vouchers or everything.
+
+    A row is one voucher that others are posted against (an invoice, or a payment
+    for its unallocated part), so payments and debit notes net into the invoice
+    they settle. Amounts follow the payable sign, so open invoices are positive.
+    Row names are an MD5 of the grouping key, so a voucher always maps to the same row.
+    """
+    conditions, values = "", {"company": company, "user": frappe.session.user}
+    if company:
+        conditions += " AND company = %(company)s"
+    if against_vouchers is not None:
+        if not against_vouchers:
+            return
+        # The voucher number alone uses the index, the pair keeps the type exact
+        conditions += """ AND {voucher_no} IN %(voucher_nos)s
+            AND ({voucher_type}, {voucher_no}) IN %(against_vouchers)s"""
+        values.update(
+            voucher_nos=tuple({d[1] for d in against_vouchers}),
+            against_vouchers=tuple(tuple(d) for d in against_vouchers),
+        )
+
+    frappe.db.sql(
+        "DELETE FROM `tabMK Party Ledger Balance` WHERE 1 = 1 {0}".format(
+            conditions.format(voucher_type="voucher_type", voucher_no="voucher_no")
+        ),
+        values,
+    )
+
+    fields = ", ".join(KEY_FIELDS)
+    frappe.db.sql(
+        f"""
+        INSERT INTO `tabMK Party Ledger Balance`
+            (name, creation, modified, owner, modified_by, {fields},
+            posting_date, due_date, account_currency, invoice_amount, outstanding, is_open)
+        SELECT
+            MD5(CONCAT_WS('::', company, account, party_type, party, against_voucher_type, against_voucher_no)),
+            NOW(), NOW(), %(user)s, %(user)s,
+            company, account, party_type, party, against_voucher_type, against_voucher_no,
+            COALESCE(MAX(IF(voucher_no = against_voucher_no, posting_date, NULL)), MIN(posting_date)),
+            MAX(IF(voucher_no = against_voucher_no, due_date, NULL)),
+            MAX(account_currency),
+            SUM(IF(voucher_no = against_voucher_no, amount_in_account_currency, 0)),
+            SUM(amount_in_account_currency),
+            ROUND(SUM(amount_in_account_currency), %(precision)s) != 0
+        FROM `tabPayment Ledger Entry`
+        WHERE delinked = 0
+        AND account_type = 'Payable'
+        {conditions.format(voucher_type="against_voucher_type", voucher_no="against_voucher_no")}
+        GROUP BY company, account, party_type, party, against_voucher_type, against_voucher_no
+        """,
+        dict(values, precision=cint(frappe.db.get_default("currency_precision")) or 2),
+    )
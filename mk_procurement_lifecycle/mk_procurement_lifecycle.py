@@ -0,0 +1,228 @@
+import json
+
+import frappe
+from frappe.model.document import Document
+
+
+# The request line a receipt or invoice line belongs to, through its order line or,
+# for receipts made straight from a Material Request, directly
+REQUEST_ITEM = "COALESCE(poi.material_request_item, pri.material_request_item)"
+
+ORDER_ITEMS = """SELECT name FROM `tabPurchase Order Item`
+    WHERE material_request_item IN %(material_request_items)s"""
+
+
+class MKProcurementLifecycle(Document):
+    pass
+
+
+def on_doctype_update():
+    frappe.db.add_index("MK Procurement Lifecycle", ["company", "transaction_date"])
+    frappe.db.add_index("MK Procurement Lifecycle", ["status", "transaction_date"])
+
+
+def get_item_condition(column, material_request_items):
+    return f"AND {column} IN %(material_request_items)s" if material_request_items is not None else ""
+
+
+def get_linked_condition(alias, receipt_item_field, order_item_field, material_request_items):
+    """Restrict receipt or invoice lines to the requests, through their indexed link fields"""
+    if material_request_items is None:
+        return ""
+
+    if receipt_item_field:
+        receipt_items = f"""SELECT name FROM `tabPurchase Receipt Item`
+            WHERE material_request_item IN %(material_request_items)s"""
+        direct = f"{alias}.{receipt_item_field} IN ({receipt_items})"
+    else:
+        direct = f"{alias}.material_request_item IN %(material_request_items)s"
+    return f"AND ({direct} OR {alias}.{order_item_field} IN ({ORDER_ITEMS}))"
+
+
+def refresh_procurement_lifecycle(material_request_items=None):
+    """Recompute the lifecycle rows of the given Material Request Items, or of all.
+
+    Each stage is summed per request line in a derived table and the rows are
+    upserted in one statement, so submit and cancel hooks only touch the lines a
+    document affects. Quantities are in stock UOM, so lines ordered or received
+    in another UOM add up. Purchase Invoices with Update Stock receive against
+    their order line as well, so they count as receipts too.
+    """
+    if material_request_items is not None:
+        material_request_items = tuple({d for d in material_request_items if d})
+        if not material_request_items:
+            return
+
+    frappe.db.sql(
+        """
+        INSERT INTO `tabMK Procurement Lifecycle`
+            (name, creation, modified, owner, modified_by, company, material_request, material_request_item,
+            item_code, item_group, stock_uom, transaction_date, status, requested_qty,
+            ordered_qty, first_order_date, last_order_date,
+            received_qty, first_receipt_date, last_receipt_date,
+            billed_qty, first_bill_date, last_bill_date)
+        SELECT
+            mri.name, NOW(), NOW(), %(user)s, %(user)s, mr.company, mr.name, mri.name,
+            mri.item_code, mri.item_group, mri.stock_uom, mr.transaction_date,
+            CASE
+                WHEN COALESCE(o.qty, 0) <= 0 THEN 'Pending'
+                WHEN o.qty < mri.stock_qty THEN 'Partially Ordered'
+                WHEN COALESCE(r.qty, 0) <= 0 THEN 'Ordered'
+                WHEN r.qty < mri.stock_qty THEN 'Partially Received'
+                ELSE 'Received'
+            END,
+            mri.stock_qty,
+            COALESCE(o.qty, 0), o.first_date, o.last_date,
+            COALESCE(r.qty, 0), r.first_date, r.last_date,
+            COALESCE(b.qty, 0), b.first_date, b.last_date
+        FROM `tabMaterial Request Item` mri
+        INNER JOIN `tabMaterial Request` mr ON mr.name = mri.parent
+        LEFT JOIN (
+            -- A closed order will not deliver its balance, so only what it received counts
+            SELECT poi.material_request_item,
+                SUM(IF(po.status = 'Closed', poi.received_qty * poi.conversion_factor, poi.stock_qty)) AS qty,
+                MIN(po.transaction_date) AS first_date, MAX(po.transaction_date) AS last_date
+            FROM `tabPurchase Order Item` poi
+            INNER JOIN `tabPurchase Order` po ON po.name = poi.parent
+            WHERE po.docstatus = 1 {order_condition}
+            GROUP BY poi.material_request_item
+        ) o ON o.material_request_item = mri.name
+        LEFT JOIN (
+            SELECT material_request_item, SUM(qty) AS qty,
+                MIN(posting_date) AS first_date, MAX(posting_date) AS last_date
+            FROM (
+                -- Receipts made straight from the request carry it without an order line
+                SELECT {request_item} AS material_request_item, pri.stock_qty AS qty, pr.posting_date
+                FROM `tabPurchase Receipt Item` pri
+                INNER JOIN `tabPurchase Receipt` pr ON pr.name = pri.parent
+                LEFT JOIN `tabPurchase Order Item` poi ON poi.name = pri.purchase_order_item
+                WHERE pr.docstatus = 1 {receipt_condition}
+                UNION ALL
+                SELECT poi.material_request_item, pii.stock_qty, pi.posting_date
+                FROM `tabPurchase Invoice Item` pii
+                INNER JOIN `tabPurchase Invoice` pi ON pi.name = pii.parent
+                INNER JOIN `tabPurchase Order Item` poi ON poi.name = pii.po_detail
+                WHERE pi.docstatus = 1 AND pi.update_stock = 1 {stock_bill_condition}
+            ) receipts
+            GROUP BY material_request_item
+        ) r ON r.material_request_item = mri.name
+        LEFT JOIN (
+            SELECT {request_item} AS material_request_item, SUM(pii.stock_qty) AS qty,
+                MIN(pi.posting_date) AS first_date, MAX(pi.posting_date) AS last_date
+            FROM `tabPurchase Invoice Item` pii
+            INNER JOIN `tabPurchase Invoice` pi ON pi.name = pii.parent
+            LEFT JOIN `tabPurchase Order Item` poi ON poi.name = pii.po_detail
+            LEFT JOIN `tabPurchase Receipt Item` pri ON pri.name = pii.pr_detail
+            WHERE pi.docstatus = 1 {bill_condition}
+            GROUP BY {request_item}
+        ) b ON b.material_request_item = mri.name
+        WHERE mr.docstatus = 1 {request_condition}
+        ON DUPLICATE KEY UPDATE
+            company = VALUES(company),
+            material_request = VALUES(material_request),
+            item_code = VALUES(item_code),
+            item_group = VALUES(item_group),
+            stock_uom = VALUES(stock_uom),
+            transaction_date = VALUES(transaction_date),
+            status = VALUES(status),
+            requested_qty = VALUES(requested_qty),
+            ordered_qty = VALUES(ordered_qty),
+            first_order_date = VALUES(first_order_date),
+            last_order_date = VALUES(last_order_date),
+            received_qty = VALUES(received_qty),
+            first_receipt_date = VALUES(first_receipt_date),
+            last_receipt_date = VALUES(last_receipt_date),
+            billed_qty = VALUES(billed_qty),
+            first_bill_date = VALUES(first_bill_date),
+            last_bill_date = VALUES(last_bill_date),
+            modified = VALUES(modified)
+        """.format(
+            request_item=REQUEST_ITEM,
+            order_condition=get_item_condition("poi.material_request_item", material_request_items),
+            receipt_condition=get_linked_condition("pri", None, "purchase_order_item", material_request_items),
+            stock_bill_condition=f"AND pii.po_detail IN ({ORDER_ITEMS})" if material_request_items is not None else "",
+            bill_condition=get_linked_condition("pii", "pr_detail", "po_detail", material_request_items),
+            request_condition=get_item_condition("mri.name", material_request_items),
+        ),
+        {"material_request_items": material_request_items, "user": frappe.session.user},
+    )
+
+
+def get_request_items_of(doctype, names):
+    """Material Request Items behind the given Purchase Order or Purchase Receipt Items"""
+    names = list({d for d in names if d})
+    if not names:
+        return []
+
+    return frappe.get_all(
+        doctype,
+        filters={"name": ("in", names), "material_request_item": ("is", "set")},
+        pluck="material_request_item",
+    )
+
+
+def update_procurement_lifecycle(doc, method=None):
+    """Refresh the request lines a document is linked to.
+
+    on_submit / on_cancel of Material Request, Purchase Receipt and Purchase
+    Invoice, and on_change of Purchase Order, which also fires when a submitted
+    order is changed through Update Items. Closing and reopening an order runs
+    no hooks, see `update_purchase_order_status`.
+    """
+    if doc.doctype == "Material Request":
+        if doc.docstatus == 2:
+            frappe.db.delete("MK Procurement Lifecycle", {"material_request": doc.name})
+            return
+        material_request_items = [d.name for d in doc.items]
+    elif doc.doctype == "Purchase Order":
+        if doc.docstatus == 0:
+            return
+        material_request_items = [d.material_request_item for d in doc.items]
+        # Lines removed through Update Items are only on the version before the save
+        previous = doc.get_doc_before_save()
+        if previous:
+            material_request_items += [d.material_request_item for d in previous.items]
+    elif doc.doctype == "Purchase Receipt":
+        material_request_items = [d.material_request_item for d in doc.items] + get_request_items_of(
+            "Purchase Order Item", [d.purchase_order_item for d in doc.items]
+        )
+    elif doc.doctype == "Purchase Invoice":
+        material_request_items = get_request_items_of(
+            "Purchase Order Item", [d.po_detail for d in doc.items]
+        ) + get_request_items_of("Purchase Receipt Item", [d.pr_detail for d in doc.items])
+    else:
+        return
+
+    refresh_procurement_lifecycle(material_request_items)
+
+
+def refresh_purchase_orders(names):
+    refresh_procurement_lifecycle(
+        frappe.get_all(
+            "Purchase Order Item",
+            filters={"parent": ("in", names), "material_request_item": ("is", "set")},
+            pluck="material_request_item",
+        )
+    )
+
+
+@frappe.whitelist()
+def update_purchase_order_status(status, name):
+    """Override of Purchase Order's `update_status`.
+
+    Closing or reopening an order sets its status through db_set, which runs no
+    doc events, while a closed order only counts what it received as ordered.
+    """
+    from erpnext.buying.doctype.purchase_order.purchase_order import update_status
+
+    update_status(status, name)
+    refresh_purchase_orders([name])
+
+
+@frappe.whitelist()
+def close_or_unclose_purchase_orders(names, status):
+    """Override of the Purchase Order list's bulk close and reopen, see `update_purchase_order_status`"""
+    from erpnext.buying.doctype.purchase_order import purchase_order
+
+    purchase_order.close_or_unclose_purchase_orders(names, status)
+    refresh_purchase_orders(json.loads(names) if isinstance(names, str) else names)
@@ -31,12 +31,11 @@ frappe.query_reports["MK Procurement Tracker"] = {
             fieldtype: "Select",
             options: [
                 "",
-                
                 "Pending",
+                "Partially Ordered",
                 "Ordered",
-                "Partially Ordered",               
+                "Partially Received",
                 "Received",
-                
             ],
         },
     ],
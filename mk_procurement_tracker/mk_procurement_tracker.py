@@ -11,67 +11,73 @@ def execute(filters=None):
         {"label": _("MR Qty"), "fieldname": "mr_qty", "fieldtype": "Float", "width": 100},
         {"label": _("PO Qty"), "fieldname": "po_qty", "fieldtype": "Float", "width": 100},
         {"label": _("Received Qty"), "fieldname": "received_qty", "fieldtype": "Float", "width": 130},
+        {"label": _("Billed Qty"), "fieldname": "billed_qty", "fieldtype": "Float", "width": 100},
         {"label": _("Pending Qty"), "fieldname": "pending_qty", "fieldtype": "Float", "width": 130},
         {"label": _("UOM"), "fieldname": "uom", "width": 50},
         {"label": _("MR No"), "fieldname": "mr_name", "fieldtype": "Link", "options": "Material Request", "width": 130},
-        {"label": _("PO No"), "fieldname": "po_name", "fieldtype": "Link", "options": "Purchase Order", "width": 130},
         {"label": _("MR Date"), "fieldname": "mr_date", "fieldtype": "Date", "width": 100},
+        {"label": _("First PO Date"), "fieldname": "first_order_date", "fieldtype": "Date", "width": 100},
+        {"label": _("First Receipt Date"), "fieldname": "first_receipt_date", "fieldtype": "Date", "width": 100},
+        {"label": _("Last Receipt Date"), "fieldname": "last_receipt_date", "fieldtype": "Date", "width": 100},
+        {"label": _("First Bill Date"), "fieldname": "first_bill_date", "fieldtype": "Date", "width": 100},
+        {"label": _("MR to PO (Days)"), "fieldname": "order_lead_days", "fieldtype": "Int", "width": 90},
+        {"label": _("PO to Receipt (Days)"), "fieldname": "receipt_lead_days", "fieldtype": "Int", "width": 90},
+        {"label": _("Receipt to Bill (Days)"), "fieldname": "bill_lead_days", "fieldtype": "Int", "width": 90},
         {"label": _("Status"), "fieldname": "status", "fieldtype": "Data", "width": 120}
     ]
 
     conditions = []
     values = []
  
+    if filters.get("company"):
+        conditions.append("pl.company = %s")
+        values.append(filters["company"])
+
     if filters.get("from_date"):
-        conditions.append("mr.transaction_date >= %s")
+        conditions.append("pl.transaction_date >= %s")
         values.append(filters["from_date"])
 
     if filters.get("to_date"):
-        conditions.append("mr.transaction_date <= %s")
+        conditions.append("pl.transaction_date <= %s")
         values.append(filters["to_date"])
 
     if filters.get("item_group"):
-        conditions.append("mri.item_group = %s")
+        conditions.append("pl.item_group = %s")
         values.append(filters["item_group"])
 
     if filters.get("status"):
-        conditions.append("mr.status = %s")
+        conditions.append("pl.status = %s")
         values.append(filters["status"])
     
     conditions_str = " AND ".join(conditions) if conditions else "1=1"
 
+    # One row per request line from MK Procurement Lifecycle, which the document
+    # hooks keep summed over all its orders, receipts and invoices
     query = f"""
         SELECT 
-            mri.item_group,
-            mri.item_code,
-            mri.qty as mr_qty,
-            COALESCE(poi.qty, 0) as po_qty,
-            COALESCE(poi.received_qty, 0) as received_qty,
-            CASE 
-                WHEN poi.qty IS NULL THEN mri.qty
-                ELSE mri.qty - COALESCE(poi.received_qty, 0)
-            END as pending_qty,
-            mri.uom,
-            mr.name as mr_name,
-            po.name as po_name,
-            mr.transaction_date as mr_date,
-            CASE 
-                WHEN po.name IS NULL THEN 'Pending'
-                WHEN COALESCE(poi.received_qty, 0) = 0 THEN 'Ordered'
-                WHEN COALESCE(poi.received_qty, 0) < mri.qty THEN 'Partially Received'
-                WHEN COALESCE(poi.received_qty, 0) >= mri.qty THEN 'Completed'
-            END as status
+            pl.item_group,
+            pl.item_code,
+            pl.requested_qty as mr_qty,
+            pl.ordered_qty as po_qty,
+            pl.received_qty,
+            pl.billed_qty,
+            GREATEST(pl.requested_qty - pl.received_qty, 0) as pending_qty,
+            pl.stock_uom as uom,
+            pl.material_request as mr_name,
+            pl.transaction_date as mr_date,
+            pl.first_order_date,
+            pl.first_receipt_date,
+            pl.last_receipt_date,
+            pl.first_bill_date,
+            DATEDIFF(pl.first_order_date, pl.transaction_date) as order_lead_days,
+            DATEDIFF(pl.first_receipt_date, pl.first_order_date) as receipt_lead_days,
+            DATEDIFF(pl.first_bill_date, pl.first_receipt_date) as bill_lead_days,
+            pl.status
         FROM 
-            `tabMaterial Request` mr
-        JOIN 
-            `tabMaterial Request Item` mri ON mr.name = mri.parent
-        LEFT JOIN 
-            `tabPurchase Order Item` poi ON mri.name = poi.material_request_item
-        LEFT JOIN 
-            `tabPurchase Order` po ON poi.parent = po.name AND po.docstatus = 1
+            `tabMK Procurement Lifecycle` pl
         WHERE 
-            mr.docstatus = 1 AND {conditions_str}
-        ORDER BY mr.transaction_date
+            {conditions_str}
+        ORDER BY pl.transaction_date
     """
 
     data = frappe.db.sql(query, tuple(values), as_dict=1)
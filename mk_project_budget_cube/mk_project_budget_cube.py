@@ -0,0 +1,206 @@
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_months, flt, get_first_day, get_last_day, getdate, now
+
+from erpnext.stock.report.mk_report_utils.consumption import CONSUMPTION
+
+MEASURES = ("ordered_amount", "received_amount", "consumed_amount", "budget_amount")
+
+# MK Project Status source queries feeding each cube measure
+SOURCE_MEASURES = {
+    "orders": "ordered_amount",
+    "receipts": "received_amount",
+    "stock_entry_consumption": "consumed_amount",
+    "delivery_note_consumption": "consumed_amount",
+    "sales_invoice_consumption": "consumed_amount",
+}
+
+
+class MKProjectBudgetCube(Document):
+    pass
+
+
+def on_doctype_update():
+    frappe.db.add_unique(
+        "MK Project Budget Cube",
+        ["company", "cost_center", "item_group", "month"],
+        constraint_name="unique_company_cost_center_item_group_month",
+    )
+    frappe.db.add_index("MK Project Budget Cube", ["company", "month"])
+
+
+def add_to_cube(company, measure, amounts):
+    """Add {(cost_center, item_group, month): amount} to the cube cells of `measure`"""
+    amounts = {key: amount for key, amount in amounts.items() if flt(amount)}
+    if not amounts:
+        return
+
+    timestamp, user = now(), frappe.session.user
+    values, params = [], {"timestamp": timestamp, "user": user, "company": company}
+    for idx, ((cost_center, item_group, month), amount) in enumerate(amounts.items()):
+        values.append(
+            f"(%(name_{idx})s, %(timestamp)s, %(timestamp)s, %(user)s, %(user)s, %(company)s,"
+            f" %(cost_center_{idx})s, %(item_group_{idx})s, %(month_{idx})s, %(amount_{idx})s)"
+        )
+        params.update({
+            f"name_{idx}": frappe.generate_hash(length=10),
+            f"cost_center_{idx}": cost_center or "",
+            f"item_group_{idx}": item_group or "",
+            f"month_{idx}": month,
+            f"amount_{idx}": flt(amount),
+        })
+
+    frappe.db.sql(
+        f"""
+        INSERT INTO `tabMK Project Budget Cube`
+            (name, creation, modified, owner, modified_by, company, cost_center, item_group, month, {measure})
+        VALUES {", ".join(values)}
+        ON DUPLICATE KEY UPDATE
+            {measure} = {measure} + VALUES({measure}),
+            modified = VALUES(modified)
+        """,
+        params,
+    )
+
+
+def get_document_amounts(doc):
+    """Return the cube measure a submitted document feeds and the rows (with signs) it adds"""
+    if doc.doctype == "Purchase Order":
+        return "ordered_amount", doc.items, 1
+    elif doc.doctype == "Purchase Receipt":
+        return "received_amount", doc.items, -1 if doc.is_return else 1
+    elif doc.doctype == "Stock Entry":
+        if doc.purpose == "Material Receipt":
+            return "received_amount", doc.items, 1
+        elif doc.consumption_kind == CONSUMPTION:
+            return "consumed_amount", [d for d in doc.items if d.s_warehouse], 1
+    elif doc.doctype == "Delivery Note" or (doc.doctype == "Sales Invoice" and doc.update_stock):
+        return "consumed_amount", doc.items, -1 if doc.is_return else 1
+
+    return None, [], 0
+
+
+def get_item_groups(item_codes):
+    """Item groups from the Item master, as MK Project Status and the rebuild read them,
+    rather than the copy on the transaction row"""
+    return dict(
+        frappe.get_all(
+            "Item", filters={"name": ("in", list(set(item_codes)))}, fields=["name", "item_group"], as_list=1
+        )
+    ) if item_codes else {}
+
+
+def update_project_budget_cube(doc, method=None):
+    """on_submit / on_cancel of Purchase Order, Purchase Receipt, Stock Entry,
+    Delivery Note and Sales Invoice: add (or on cancel remove) the document's amounts"""
+    measure, rows, sign = get_document_amounts(doc)
+    if not measure:
+        return
+
+    if doc.docstatus == 2:
+        sign = -sign
+
+    month = get_first_day(doc.transaction_date if doc.doctype == "Purchase Order" else doc.posting_date)
+    item_groups = get_item_groups([d.item_code for d in rows])
+    amounts = {}
+    for d in rows:
+        key = (doc.cost_center, item_groups.get(d.item_code), month)
+        amounts[key] = amounts.get(key, 0.0) + sign * flt(d.amount)
+
+    add_to_cube(doc.company, measure, amounts)
+
+
+def get_monthly_budget(doc):
+    """Spread a Budget over the months of its fiscal year, by its monthly distribution if set"""
+    year_start_date = getdate(frappe.get_cached_value("Fiscal Year", doc.fiscal_year, "year_start_date"))
+    total = sum(flt(d.budget_amount) for d in doc.accounts)
+
+    percentages = {}
+    if doc.monthly_distribution:
+        percentages = dict(
+            frappe.get_all(
+                "Monthly Distribution Percentage",
+                filters={"parent": doc.monthly_distribution},
+                fields=["month", "percentage_allocation"],
+                as_list=1,
+            )
+        )
+
+    # A fiscal year may start mid-month; the cube and the report bucket by month start
+    months = [get_first_day(add_months(year_start_date, idx)) for idx in range(12)]
+    return {
+        month: total * flt(percentages.get(month.strftime("%B"), 0) if percentages else 100 / 12) / 100
+        for month in months
+    }
+
+
+def update_budget_in_cube(doc, method=None):
+    """on_submit / on_cancel of Budget; budgets are per account, so they are kept at
+    cost center level with a blank item group"""
+    if doc.budget_against != "Cost Center":
+        return
+
+    sign = -1 if doc.docstatus == 2 else 1
+    amounts = {
+        (doc.cost_center, "", month): sign * amount
+        for month, amount in get_monthly_budget(doc).items()
+    }
+    add_to_cube(doc.company, "budget_amount", amounts)
+
+
+def rebuild_project_budget_cube(company, from_date, to_date):
+    """Recompute the actual amounts of whole months from the source documents.
+
+    Submit hooks record amounts as submitted; a stock repost that revalues later
+    material issues is picked up by rebuilding the affected months. Budget
+    amounts are left untouched.
+    """
+    from erpnext.stock.report.mk_project_status.mk_project_status import ProjectAnalytics
+
+    from_date, to_date = get_first_day(from_date), get_last_day(to_date)
+
+    frappe.db.sql(
+        """
+        UPDATE `tabMK Project Budget Cube`
+        SET ordered_amount = 0, received_amount = 0, consumed_amount = 0
+        WHERE company = %s AND month BETWEEN %s AND %s
+        """,
+        (company, from_date, to_date),
+    )
+
+    report = ProjectAnalytics({"company": company, "from_date": from_date, "to_date": to_date, "range": "Monthly"})
+    entries_by_source = report.run_source_queries([(from_date, to_date)], month_wise=True)
+
+    amounts_by_measure = {}
+    for source, entries in entries_by_source.items():
+        amounts = amounts_by_measure.setdefault(SOURCE_MEASURES[source], {})
+        for d in entries:
+            key = (d.cost_center, d.item_group, getdate(d.month))
+            amounts[key] = amounts.get(key, 0.0) + flt(d.amount)
+
+    for measure, amounts in amounts_by_measure.items():
+        add_to_cube(company, measure, amounts)
+
+
+def rebuild_all_project_budget_cubes():
+    """Rebuild the actual amounts of every month held in the cube, for every company"""
+    for company, first_month, last_month in frappe.db.sql(
+        """
+        SELECT company, MIN(month), MAX(month)
+        FROM `tabMK Project Budget Cube`
+        GROUP BY company
+        """
+    ):
+        rebuild_project_budget_cube(company, first_month, last_month)
+
+
+def regroup_item_in_cube(doc, method=None):
+    """Item on_update: moving an item to another group re-attributes its history, as
+    the project status cache is cleared for, so the cube is rebuilt in the background"""
+    if doc.has_value_changed("item_group"):
+        frappe.enqueue(
+            "erpnext.stock.doctype.mk_project_budget_cube.mk_project_budget_cube.rebuild_all_project_budget_cubes",
+            queue="long",
+            job_id="mk_project_budget_cube::rebuild_all",
+            deduplicate=True,
+        )
@@ -0,0 +1,42 @@
+frappe.query_reports["MK Project Budget Status"] = {
+	"filters": [
+		{
+			fieldname: "company",
+			label: __("Company"),
+			fieldtype: "Link",
+			options: "Company",
+			default: frappe.defaults.get_user_default("Company"),
+			reqd: 1
+		},
+		{
+			fieldname: "from_date",
+			label: __("From Date"),
+			fieldtype: "Date",
+			default: erpnext.utils.get_fiscal_year(frappe.datetime.get_today(), true)[1],
+			description: __("Amounts are kept per month; the whole starting month is included"),
+			reqd: 1
+		},
+		{
+			fieldname:"to_date",
+			label: __("To Date"),
+			fieldtype: "Date",
+			default: erpnext.utils.get_fiscal_year(frappe.datetime.get_today(), true)[2],
+			reqd: 1
+		},
+		{
+			label: __("Cost Center"),
+			fieldname: "cost_center",
+			fieldtype: "Link",
+			options: "Cost Center",
+			get_query: () => {
+				return { filters: { company: frappe.query_report.get_filter_value("company") } };
+			},
+		},
+		{
+			label: __("Item Group"),
+			fieldname: "item_group",
+			fieldtype: "Link",
+			options: "Item Group",
+		},
+	],
+};
@@ -0,0 +1,101 @@
+import frappe
+from frappe import _
+from frappe.utils import flt, get_first_day
+
+
+def execute(filters=None):
+    filters = frappe._dict(filters or {})
+    columns = get_columns()
+    data = get_data(filters)
+    return columns, data, None, get_chart_data(data)
+
+
+def get_columns():
+    columns = [
+        {
+            "label": _("Cost Center"),
+            "fieldname": "cost_center",
+            "fieldtype": "Link",
+            "options": "Cost Center",
+            "width": 220,
+        }
+    ]
+    for fieldname, label in (
+        ("budget_amount", _("Budget")),
+        ("ordered_amount", _("Ordered")),
+        ("received_amount", _("Received")),
+        ("consumed_amount", _("Consumed")),
+        ("pending_receipt", _("Pending Receipt")),
+        ("variance", _("Budget Variance")),
+    ):
+        columns.append({"label": label, "fieldname": fieldname, "fieldtype": "Currency", "width": 140})
+
+    columns.append({"label": _("Budget Used %"), "fieldname": "budget_used", "fieldtype": "Percent", "width": 120})
+    return columns
+
+
+def get_conditions(filters):
+    conditions = ""
+    if filters.get("cost_center"):
+        conditions += """ AND cc.lft >= (SELECT lft FROM `tabCost Center` WHERE name = %(cost_center)s)
+            AND cc.rgt <= (SELECT rgt FROM `tabCost Center` WHERE name = %(cost_center)s)"""
+    if filters.get("item_group"):
+        # Budgets are recorded per cost center (blank item group), so they stay in
+        conditions += """ AND (pbc.item_group = '' OR pbc.item_group IN (
+            SELECT child.name FROM `tabItem Group` child, `tabItem Group` root
+            WHERE root.name = %(item_group)s AND child.lft BETWEEN root.lft AND root.rgt))"""
+    return conditions
+
+
+def get_data(filters):
+    # Every project in one pass over the monthly cube
+    rows = frappe.db.sql(
+        """
+        SELECT
+            pbc.cost_center,
+            SUM(pbc.budget_amount) AS budget_amount,
+            SUM(pbc.ordered_amount) AS ordered_amount,
+            SUM(pbc.received_amount) AS received_amount,
+            SUM(pbc.consumed_amount) AS consumed_amount
+        FROM `tabMK Project Budget Cube` pbc
+        INNER JOIN `tabCost Center` cc ON cc.name = pbc.cost_center
+        WHERE pbc.company = %(company)s
+        AND pbc.month BETWEEN %(from_month)s AND %(to_date)s
+        {conditions}
+        GROUP BY pbc.cost_center
+        ORDER BY MIN(cc.lft)
+        """.format(conditions=get_conditions(filters)),
+        dict(filters, from_month=get_first_day(filters.from_date)),
+        as_dict=1,
+    )
+
+    data = []
+    for row in rows:
+        if not any(flt(row[measure]) for measure in
+                ("budget_amount", "ordered_amount", "received_amount", "consumed_amount")):
+            continue
+        row.pending_receipt = flt(row.ordered_amount) - flt(row.received_amount)
+        row.variance = flt(row.budget_amount) - flt(row.consumed_amount)
+        row.budget_used = (
+            flt(row.consumed_amount) / flt(row.budget_amount) * 100 if flt(row.budget_amount) else None
+        )
+        data.append(row)
+    return data
+
+
+def get_chart_data(data):
+    if not data:
+        return None
+
+    return {
+        "data": {
+            "labels": [row.cost_center for row in data],
+            "datasets": [
+                {"name": _("Budget"), "values": [flt(row.budget_amount) for row in data]},
+                {"name": _("Ordered"), "values": [flt(row.ordered_amount) for row in data]},
+                {"name": _("Consumed"), "values": [flt(row.consumed_amount) for row in data]},
+            ],
+        },
+        "type": "bar",
+        "fieldtype": "Currency",
+    }
@@ -50,5 +50,17 @@ frappe.query_reports["MK Project Status"] = {
                         options: "Cost Center",
                         width: 100,
                 },
+		{
+			label: __("Run Queries in Parallel"),
+			fieldname: "parallel_queries",
+			fieldtype: "Check",
+			default: 0,
+		},
+		{
+			label: __("Show Source Breakdown"),
+			fieldname: "debug",
+			fieldtype: "Check",
+			default: 0,
+		},
 	],
 };
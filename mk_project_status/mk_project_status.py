@@ -1,11 +1,24 @@
+from functools import partial
+from operator import add
+
 import frappe
 from frappe import _, scrub
-from frappe.utils import add_days, add_to_date, flt, getdate
+from frappe.utils import add_days, add_months, cint, flt, get_first_day, get_last_day, getdate, nowdate
 from frappe.query_builder import DocType, Case
-from pypika.terms import ValueWrapper
+from frappe.query_builder.functions import Sum
+from pypika.terms import LiteralValue
+
+from erpnext.stock.doctype.mk_project_status_cache.mk_project_status_cache import (
+    enqueue_build_months,
+    get_cached_entries,
+    get_missing_months,
+)
+from erpnext.stock.report.mk_report_utils.concurrency import run_concurrently
+from erpnext.stock.report.mk_report_utils.periods import PeriodBuckets, get_month_start_sql
+from erpnext.stock.report.mk_report_utils.tree import filter_subtree_rows
+
+MEASURES = ("orders", "receipts", "consumption")
 
-from erpnext.accounts.utils import get_fiscal_year
-from frappe.utils.nestedset import get_descendants_of
 
 def execute(filters=None):
     report = ProjectAnalytics(filters)
@@ -22,35 +35,26 @@ class ProjectAnalytics(object):
         if self.filters.range and self.filters.range not in valid_ranges:
             frappe.throw(_("Invalid range. Please select from {0}").format(", ".join(valid_ranges)))
             
-        self.months = [
-            "Jan",
-            "Feb",
-            "Mar",
-            "Apr",
-            "May",
-            "Jun",
-            "Jul",
-            "Aug",
-            "Sep",
-            "Oct",
-            "Nov",
-            "Dec",
-        ]
-        self.get_period_date_ranges()
+        self.periods = PeriodBuckets(
+            self.filters.from_date,
+            self.filters.to_date,
+            self.filters.range,
+            company=self.filters.company,
+            max_periods=52,
+        )
 
     def run(self):
         self.get_columns()
         self.get_groups()
-        self.get_orders_data()
-        self.get_receipts_data()
-        self.get_consumption_data()
+        self.get_data()
         self.get_rows_by_group()
         skip_total_row = 1
 
         if self.filters.get("item_group"):
             # filter data based on item group and children
-            children = get_descendants_of("Item Group", self.filters.item_group, ignore_permissions=True)
-            self.filtered_data = [d for d in self.data if d.get("item_group") in [self.filters.item_group] + children]
+            self.filtered_data = filter_subtree_rows(
+                self.data, self.group_entries, self.filters.item_group, "item_group"
+            )
         else:
             self.filtered_data = self.data
             
@@ -58,8 +62,10 @@ class ProjectAnalytics(object):
             self.get_chart_data()
         else:
             self.chart = None
-            
-        return self.columns, self.filtered_data, None, self.chart, None, skip_total_row
+
+        message = self.get_debug_message() if self.filters.get("debug") else None
+
+        return self.columns, self.filtered_data, message, self.chart, None, skip_total_row
 
     def get_columns(self):
         self.columns = [
@@ -72,8 +78,7 @@ class ProjectAnalytics(object):
             }
         ]
 
-        for end_date in self.periodic_daterange:
-            period = self.get_period(end_date)
+        for period in self.periods.labels:
             self.chart_labels.append(period)
             self.columns.append(
                 {"label": "Orders " + period, "fieldname": "orders" + scrub(period), "fieldtype": "Currency"})
@@ -90,19 +95,127 @@ class ProjectAnalytics(object):
         self.columns.append(
             {"label": "Total Consumption", "fieldname": "consumption_total", "fieldtype": "Currency", "width": 120})
 
-    def get_orders_data(self):
-        self.get_purchase_transactions_based_on_item_group()
+    def get_data(self):
+        # Closed months are read from MK Project Status Cache; the open edges of the
+        # range (partial or current months) and months not built yet are queried live
+        self.cache_window = cache_window = self.get_cache_window()
+        if cache_window:
+            self.live_ranges = self.get_live_ranges(*cache_window)
+        else:
+            self.live_ranges = [(self.filters.from_date, self.filters.to_date)]
 
-    def get_receipts_data(self):
-        self.get_receipt_transactions_based_on_item_group()
+        self.entries_by_source = entries_by_source = self.run_source_queries(self.live_ranges)
+        if cache_window:
+            self.add_cached_entries(entries_by_source, *cache_window)
 
-    def get_consumption_data(self):
-        self.get_consumption_transactions_based_on_item_group()
+        self.order_entries = entries_by_source["orders"]
+        self.receipt_entries = entries_by_source["receipts"]
+        ste_entries = entries_by_source["stock_entry_consumption"]
+        dn_entries = entries_by_source["delivery_note_consumption"]
+        si_entries = entries_by_source["sales_invoice_consumption"]
+        self.consumption_entries = ste_entries + dn_entries + si_entries
 
-    def get_purchase_transactions_based_on_item_group(self):
+    def get_sources(self):
+        return {
+            "orders": self.get_purchase_transactions_based_on_item_group,
+            "receipts": self.get_receipt_transactions_based_on_item_group,
+            "stock_entry_consumption": self.get_ste_consumption_transactions,
+            "delivery_note_consumption": self.get_dn_consumption_transactions,
+            "sales_invoice_consumption": self.get_si_consumption_transactions,
+        }
+
+    def run_source_queries(self, date_ranges, month_wise=False):
+        """Run every source query over each date range and collect the rows per source"""
+        sources = self.get_sources()
+        fetchers, keys = [], []
+        for from_date, to_date in date_ranges:
+            for source, fetch in sources.items():
+                fetchers.append(partial(fetch, from_date, to_date, month_wise))
+                keys.append(source)
+
+        # The source queries are independent reads, so they can run side by side
+        if self.filters.get("parallel_queries"):
+            results = run_concurrently(fetchers)
+        else:
+            results = [fetch() for fetch in fetchers]
+
+        entries_by_source = {source: [] for source in sources}
+        for source, entries in zip(keys, results):
+            entries_by_source[source].extend(entries)
+        return entries_by_source
+
+    def get_cache_window(self):
+        """Return the first and last month start of the closed, whole months in the range"""
+        if self.filters.range == "Weekly" or not self.filters.get("company"):
+            return None
+
+        from_date, to_date = getdate(self.filters.from_date), getdate(self.filters.to_date)
+        first_month = from_date if from_date.day == 1 else get_first_day(add_months(from_date, 1))
+        last_month = get_first_day(to_date) if to_date == get_last_day(to_date) else get_first_day(add_months(to_date, -1))
+        last_month = min(last_month, get_first_day(add_months(getdate(nowdate()), -1)))
+
+        if first_month > last_month:
+            return None
+        return first_month, last_month
+
+    def get_live_ranges(self, first_month, last_month):
+        live_ranges = []
+        if getdate(self.filters.from_date) < first_month:
+            live_ranges.append((self.filters.from_date, add_days(first_month, -1)))
+
+        # Months the cache does not hold yet are read live and built in the background
+        self.missing_months = missing_months = get_missing_months(self.filters.company, first_month, last_month)
+        if missing_months:
+            enqueue_build_months(self.filters.company, first_month, last_month)
+        for month in missing_months:
+            if live_ranges and add_days(getdate(live_ranges[-1][1]), 1) == month:
+                live_ranges[-1] = (live_ranges[-1][0], get_last_day(month))
+            else:
+                live_ranges.append((month, get_last_day(month)))
+
+        if get_last_day(last_month) < getdate(self.filters.to_date):
+            live_ranges.append((add_days(get_last_day(last_month), 1), self.filters.to_date))
+        return live_ranges
+
+    def add_cached_entries(self, entries_by_source, first_month, last_month):
+        cached_entries = get_cached_entries(
+            self.filters.company,
+            first_month,
+            last_month,
+            self.periods,
+            self.filters.get("cost_center"),
+            # Months read live stay excluded even if the background build finishes meanwhile
+            exclude_months=self.missing_months,
+        )
+        for d in cached_entries:
+            for source, entries in entries_by_source.items():
+                if flt(d[source]):
+                    entries.append(
+                        frappe._dict(item_group=d.item_group, period_idx=d.period_idx, amount=d[source])
+                    )
+
+    def get_bucket_terms(self, date_field, cost_center_field, month_wise):
+        """Query builder terms that bucket a source query by report period, or for
+        the cache by cost center and month"""
+        if month_wise:
+            month = get_month_start_sql(date_field.get_sql(with_namespace=True, quote_char="`"))
+            return {"cost_center": cost_center_field, "month": LiteralValue(month)}
+        return {"period_idx": self.periods.get_index_term(date_field)}
+
+    def get_bucket_sql(self, alias, month_wise):
+        """Raw SQL version of `get_bucket_terms` for the `alias` table"""
+        if month_wise:
+            return (
+                f"{alias}.cost_center as cost_center, {get_month_start_sql(alias + '.posting_date')} as month",
+                "cost_center, month",
+            )
+        return f"{self.periods.get_index_sql(alias + '.posting_date')} as period_idx", "period_idx"
+
+    def get_purchase_transactions_based_on_item_group(self, from_date, to_date, month_wise=False):
         tran = DocType("Purchase Order")
         detail = DocType("Purchase Order Item")
         item = DocType("Item")
+        buckets = self.get_bucket_terms(tran.transaction_date, tran.cost_center, month_wise)
         query = (
             frappe.qb.from_(tran)
             .inner_join(detail)
@@ -111,37 +224,28 @@ class ProjectAnalytics(object):
             .on(detail.item_code == item.name)
             .select(
                 item.item_group,
-                item.item_code,
-                tran.transaction_date,
-                tran.name.as_("voucher_no"),
-                tran.supplier,
-                detail.qty,
-                detail.rate,
-                detail.amount,
-                detail.base_amount,
-                tran.company,
-                tran.status
+                *[term.as_(alias) for alias, term in buckets.items()],
+                Sum(detail.amount).as_("amount"),
             )
             .where((detail.docstatus == 1) & (tran.docstatus == 1))
+            .where(tran.transaction_date.between(from_date, to_date))
+            .groupby(item.item_group, *buckets.values())
         )
 
         if self.filters.get("company"):
             query = query.where(tran.company == self.filters.company)
-        if self.filters.get("from_date"):
-            query = query.where(tran.transaction_date >= self.filters.from_date)
-        if self.filters.get("to_date"):
-            query = query.where(tran.transaction_date <= self.filters.to_date)
-        if self.filters.get("cost_center"):
+        # The cache holds every cost center, the filter is applied when reading it
+        if self.filters.get("cost_center") and not month_wise:
             query = query.where(tran.cost_center == self.filters.cost_center)
             
-        self.order_entries = query.run(as_dict=1)
-        
+        return query.run(as_dict=1)
 
-    def get_receipt_transactions_based_on_item_group(self):
+    def get_receipt_transactions_based_on_item_group(self, from_date, to_date, month_wise=False):
         # Get receipts from Purchase Receipt
         pr = DocType("Purchase Receipt")
         pr_item = DocType("Purchase Receipt Item")
         item = DocType("Item")
+        pr_buckets = self.get_bucket_terms(pr.posting_date, pr.cost_center, month_wise)
         pr_query = (
             frappe.qb.from_(pr)
             .inner_join(pr_item)
@@ -150,25 +254,25 @@ class ProjectAnalytics(object):
             .on(pr_item.item_code == item.name)
             .select(
                 item.item_group,
-                item.item_code,
-                pr.posting_date,
-                pr.name.as_("voucher_no"),
-                pr_item.warehouse,
-                Case()
-                .when(pr.is_return == 1, -pr_item.amount)
-                .else_(pr_item.amount)
-                .as_("amount"),
-                ValueWrapper("Purchase Receipt").as_("voucher_type")
+                *[term.as_(alias) for alias, term in pr_buckets.items()],
+                Sum(
+                    Case()
+                    .when(pr.is_return == 1, -pr_item.amount)
+                    .else_(pr_item.amount)
+                ).as_("amount"),
             )
             .where(
                 (pr_item.docstatus == 1) &
                 (pr.docstatus == 1)
             )
+            .where(pr.posting_date.between(from_date, to_date))
+            .groupby(item.item_group, *pr_buckets.values())
         )
 
         # Get receipts from Stock Entry
         se = DocType("Stock Entry")
         se_detail = DocType("Stock Entry Detail")
+        se_buckets = self.get_bucket_terms(se.posting_date, se.cost_center, month_wise)
         se_query = (
             frappe.qb.from_(se)
             .inner_join(se_detail)
@@ -177,379 +281,177 @@ class ProjectAnalytics(object):
             .on(se_detail.item_code == item.name)
             .select(
                 item.item_group,
-                item.item_code,
-                se.posting_date,
-                se.name.as_("voucher_no"),
-                se_detail.t_warehouse.as_("warehouse"),
-                se_detail.amount,
-                ValueWrapper("Stock Entry").as_("voucher_type")
+                *[term.as_(alias) for alias, term in se_buckets.items()],
+                Sum(se_detail.amount).as_("amount"),
             )
             .where(
                 (se_detail.docstatus == 1) &
                 (se.docstatus == 1) &
                 (se.purpose == "Material Receipt")
             )
+            .where(se.posting_date.between(from_date, to_date))
+            .groupby(item.item_group, *se_buckets.values())
         )
 
         # Apply filters before union
         if self.filters.get("company"):
             pr_query = pr_query.where(pr.company == self.filters.company)
             se_query = se_query.where(se.company == self.filters.company)
-        if self.filters.get("from_date"):
-            pr_query = pr_query.where(pr.posting_date >= self.filters.from_date)
-            se_query = se_query.where(se.posting_date >= self.filters.from_date)
-        if self.filters.get("to_date"):
-            pr_query = pr_query.where(pr.posting_date <= self.filters.to_date)
-            se_query = se_query.where(se.posting_date <= self.filters.to_date)
-        if self.filters.get("cost_center"):
+        if self.filters.get("cost_center") and not month_wise:
             pr_query = pr_query.where(pr.cost_center == self.filters.cost_center)
             se_query = se_query.where(se.cost_center == self.filters.cost_center)
 
         # Combine queries after applying filters
         query = pr_query.union_all(se_query)
             
-        self.receipt_entries = query.run(as_dict=1)
-        
-        
+        return query.run(as_dict=1)
 
-    def get_consumption_transactions_based_on_item_group(self):
-        conditions = ""
+    def get_consumption_conditions(self, alias, month_wise=False):
+        conditions = f" AND {alias}.posting_date BETWEEN %(from_date)s AND %(to_date)s"
         if self.filters.get("company"):
-            conditions += " AND se.company = %(company)s"
-        if self.filters.get("from_date"):
-            conditions += " AND se.posting_date >= %(from_date)s"
-        if self.filters.get("to_date"):
-            conditions += " AND se.posting_date <= %(to_date)s"
-        if self.filters.get("cost_center"):
-            conditions += " AND se.cost_center = %(cost_center)s"
-
-        def get_ste_data():
-            query = f"""
-                SELECT
-                    itm.item_group,
-                    se.posting_date,
-                    sed.amount,
-                    se.name as voucher_no,
-                    sed.item_code,
-                    'Stock Entry' as voucher_type,
-                    CONCAT('Material Issue [Source:',
-                        COALESCE(sed.s_warehouse, 'NULL'),
-                        ' Target:', COALESCE(sed.t_warehouse, 'NULL'),
-                        ']') as entry_type
-                FROM `tabStock Entry` se
-                INNER JOIN `tabStock Entry Detail` sed ON se.name = sed.parent
-                INNER JOIN `tabItem` itm ON sed.item_code = itm.name
-                WHERE se.docstatus = 1
-                AND (
-                    -- Include entries that are genuine Material Issues:
-                    -- 1. Must be Material Issue purpose
-                    se.purpose = 'Material Issue'
-                    -- 2. Must have MI- prefix in name (Material Issue)
-                    AND se.name LIKE 'MI-%%'
-                    -- 3. Must not be a transfer (check for specific pattern)
-                    AND se.name NOT LIKE 'MAT-%%'
-                    -- 4. Must have source warehouse
-                    AND sed.s_warehouse IS NOT NULL
-                    -- 5. Must be a consumption, not internal movement
-                    AND NOT EXISTS (
-                        SELECT 1 FROM `tabStock Entry Detail` sed2
-                        WHERE sed2.parent = se.name
-                        AND sed2.t_warehouse IS NOT NULL
-                    )
-                )
-                {conditions}
-            """
-            return frappe.db.sql(query, self.filters, as_dict=1)
-            
-        def get_dn_data():
-            query = f"""
-                SELECT
-                    itm.item_group,
-                    dn.posting_date,
-                    CASE WHEN dn.is_return = 1 THEN -1 * dni.amount ELSE dni.amount END as amount,
-                    dn.name as voucher_no,
-                    dni.item_code,
-                    'Delivery Note' as voucher_type,
-                    CASE WHEN dn.is_return = 1 THEN 'Sales Return' ELSE 'Delivery' END as entry_type
-                FROM `tabDelivery Note` dn
-                INNER JOIN `tabDelivery Note Item` dni ON dn.name = dni.parent
-                INNER JOIN `tabItem` itm ON dni.item_code = itm.name
-                WHERE dn.docstatus = 1
-                AND dni.docstatus = 1
-                {conditions.replace('se.', 'dn.')}
-            """
-            return frappe.db.sql(query, self.filters, as_dict=1)
-            
-        def get_si_data():
-            query = f"""
-                SELECT
-                    itm.item_group,
-                    si.posting_date,
-                    CASE WHEN si.is_return = 1 THEN -1 * sii.amount ELSE sii.amount END as amount,
-                    si.name as voucher_no,
-                    sii.item_code,
-                    'Sales Invoice' as voucher_type,
-                    CASE WHEN si.is_return = 1 THEN 'Sales Return' ELSE 'Direct Invoice' END as entry_type
-                FROM `tabSales Invoice` si
-                INNER JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
-                INNER JOIN `tabItem` itm ON sii.item_code = itm.name
-                WHERE si.docstatus = 1
-                AND sii.docstatus = 1
-                AND si.update_stock = 1
-                {conditions.replace('se.', 'si.')}
-            """
-            return frappe.db.sql(query, self.filters, as_dict=1)
-
-        # Get and validate each type of consumption entry
-        ste_entries = get_ste_data()
-        print("\nDEBUG: Analyzing Stock Entry Consumption:")
-        ste_total = 0
-        ste_by_pattern = {'MI-': 0, 'MAT-': 0, 'Other': 0}
-        
-        for entry in ste_entries:
-            amount = entry.amount or 0
-            ste_total += amount
-            
-            # Categorize by naming pattern
-            if entry.voucher_no.startswith('MI-'):
-                ste_by_pattern['MI-'] += amount
-            elif entry.voucher_no.startswith('MAT-'):
-                ste_by_pattern['MAT-'] += amount
-            else:
-                ste_by_pattern['Other'] += amount
-            
-            # Print detailed entry info
-            if amount != 0:  # Only show non-zero entries
-                print(f"Entry: {entry.voucher_no}")
-                print(f"  Amount: {amount:,.2f}")
-                print(f"  Type: {entry.entry_type}")
-                print(f"  Group: {entry.item_group}")
-                print("  -----------")
-                
-        print("\nStock Entry Totals by Pattern:")
-        for pattern, total in ste_by_pattern.items():
-            print(f"{pattern}: {total:,.2f}")
-        print(f"Total: {ste_total:,.2f}")
-
-        dn_entries = get_dn_data()
-        print("\nDEBUG: Delivery Note Consumption Details:")
-        for entry in dn_entries:
-            print(f"Delivery {entry.voucher_no}: {entry.amount:,.2f} | {entry.entry_type}")
-        print(f"Total Delivery Consumption: {sum(e.amount for e in dn_entries):,.2f}")
-
-        si_entries = get_si_data()
-        print("\nDEBUG: Sales Invoice Consumption Details:")
-        for entry in si_entries:
-            print(f"Invoice {entry.voucher_no}: {entry.amount:,.2f} | {entry.entry_type}")
-        print(f"Total Direct Invoice Consumption: {sum(e.amount for e in si_entries):,.2f}")
-
-        # Combine all entries
-        self.consumption_entries = ste_entries + dn_entries + si_entries
-        print(f"\nDEBUG: Total Combined Consumption: {sum(e.amount for e in self.consumption_entries):,.2f}")
-
-        # Summarize and print debug information
-        type_totals = {}
-        for entry in self.consumption_entries:
-            entry_type = entry.get('entry_type', '').split('[')[0].strip()  # Get clean type without warehouse info
-            type_totals[entry_type] = type_totals.get(entry_type, 0) + entry.amount
-
-        print("\nDEBUG: Consumption by Type:")
-        for entry_type, total in sorted(type_totals.items()):
-            print(f"{entry_type}: {total:,.2f}")
-            
-        print("\nDEBUG: Sample Entries:")
-        for entry in self.consumption_entries[:5]:  # Show first 5 entries
-            print(f"Entry: {entry.voucher_no} | Type: {entry.entry_type} | Amount: {entry.amount} | Group: {entry.item_group}")
-        
-    def get_rows_by_group(self):
-        self.get_orders_periodic_data()
-        self.get_receipts_periodic_data()
-        self.get_consumption_periodic_data()
-        out = []
-
-        for d in reversed(self.group_entries):
-            row = {"item_group": d.name, "indent": self.depth_map.get(d.name)}
-            ototal = rtotal = ctotal = 0
-            for end_date in self.periodic_daterange:
-                period = self.get_period(end_date)
-                oamount = flt(self.orders_periodic_data.get(d.name, {}).get(period, 0.0))
-                ramount = flt(self.receipts_periodic_data.get(d.name, {}).get(period, 0.0))
-                camount = flt(self.consumption_periodic_data.get(d.name, {}).get(period, 0.0))
-                row["orders" + scrub(period)] = oamount
-                row["receipts" + scrub(period)] = ramount
-                row["consumption" + scrub(period)] = camount
-                if d.parent:
-                    self.orders_periodic_data.setdefault(d.parent, frappe._dict()).setdefault(period, 0.0)
-                    self.receipts_periodic_data.setdefault(d.parent, frappe._dict()).setdefault(period, 0.0)
-                    self.consumption_periodic_data.setdefault(d.parent, frappe._dict()).setdefault(period, 0.0)
-                    self.orders_periodic_data[d.parent][period] += oamount
-                    self.receipts_periodic_data[d.parent][period] += ramount
-                    self.consumption_periodic_data[d.parent][period] += camount
-                ototal += oamount
-                rtotal += ramount
-                ctotal += camount
-
-            row["orders_total"] = ototal
-            row["receipts_total"] = rtotal
-            row["consumption_total"] = ctotal
-            out = [row] + out
-
-        self.data = out
-
-    def get_orders_periodic_data(self):
-        self.orders_periodic_data = frappe._dict()
-        cement_total = 0.0
-        
-        # First pass: Collect direct amounts for each item group
-        for d in self.order_entries:
-            period = self.get_period(d.get("transaction_date"))
-            amount = flt(d.amount)
-            
-                
-
-            
-            self.orders_periodic_data.setdefault(d.item_group, frappe._dict()).setdefault(period, 0.0)
-            self.orders_periodic_data[d.item_group][period] += amount
-        
-        
-            
-        # Second pass: Roll up amounts to parent groups
-        for d in reversed(self.group_entries):
-            if not d.parent:
-                continue
-                
-            for period in self.periodic_daterange:
-                period_key = self.get_period(period)
-                child_amount = self.orders_periodic_data.get(d.name, {}).get(period_key, 0.0)
-                
-                if child_amount:
-                    self.orders_periodic_data.setdefault(d.parent, frappe._dict()).setdefault(period_key, 0.0)
-                    self.orders_periodic_data[d.parent][period_key] += child_amount
-
-    def get_receipts_periodic_data(self):
-        self.receipts_periodic_data = frappe._dict()
-        
-        
-        # First pass: Collect direct amounts for each item group
-        receipts_data = {"total": 0}
-        for d in self.receipt_entries:
-            period = self.get_period(d.get("posting_date"))
-            amount = flt(d.amount)
-            
-            if d.item_group == "CEMENTS":
-                receipts_data["total"] += amount
-            
-            self.receipts_periodic_data.setdefault(d.item_group, frappe._dict()).setdefault(period, 0.0)
-            self.receipts_periodic_data[d.item_group][period] += amount
-            
-        if receipts_data["total"] > 0:
-            print(f"Total Receipts: {receipts_data['total']:,.2f}")
-        
-        
-            
-        # Second pass: Roll up amounts to parent groups
-        for d in reversed(self.group_entries):
-            if not d.parent:
-                continue
-                
-            for period in self.periodic_daterange:
-                period_key = self.get_period(period)
-                child_amount = self.receipts_periodic_data.get(d.name, {}).get(period_key, 0.0)
-                
-                if child_amount:
-                    self.receipts_periodic_data.setdefault(d.parent, frappe._dict()).setdefault(period_key, 0.0)
-                    self.receipts_periodic_data[d.parent][period_key] += child_amount
-
-    def get_consumption_periodic_data(self):
-        self.consumption_periodic_data = frappe._dict()
-        
-        # First pass: Collect direct amounts for each item group
-        consumption_data = {"total": 0}
-        for d in self.consumption_entries:
-            period = self.get_period(d.get("posting_date"))
-            amount = flt(d.amount)
-            
-            if d.item_group == "CEMENTS":
-                consumption_data["total"] += amount
-            
-            self.consumption_periodic_data.setdefault(d.item_group, frappe._dict()).setdefault(period, 0.0)
-            self.consumption_periodic_data[d.item_group][period] += amount
-            
-        if consumption_data["total"] > 0:
-            print("\n=== CEMENTS SUMMARY ===")
-            print(f"Total Consumption: {consumption_data['total']:,.2f}")
-            print("===\n")
-        
-
-        
-        # Second pass: Roll up amounts to parent groups
-        for d in reversed(self.group_entries):
-            if not d.parent:
-                continue
-                
-            frappe.msgprint(f"DEBUG: Processing parent rollup for {d.name} -> {d.parent}")
-            period_totals = frappe._dict()
-                
-            for period in self.periodic_daterange:
-                period_key = self.get_period(period)
-                child_amount = self.consumption_periodic_data.get(d.name, {}).get(period_key, 0.0)
-                
-                if child_amount:
-                    self.consumption_periodic_data.setdefault(d.parent, frappe._dict()).setdefault(period_key, 0.0)
-                    self.consumption_periodic_data[d.parent][period_key] += child_amount
-                    period_totals[period_key] = self.consumption_periodic_data[d.parent][period_key]
-            
-
-    def get_period(self, posting_date):
-        if self.filters.range == "Weekly":
-            period = _("Week {0} {1}").format(str(posting_date.isocalendar()[1]), str(posting_date.year))
-        elif self.filters.range == "Monthly":
-            period = _(str(self.months[posting_date.month - 1])) + " " + str(posting_date.year)
-        elif self.filters.range == "Quarterly":
-            period = _("Quarter {0} {1}").format(
-                str(((posting_date.month - 1) // 3) + 1), str(posting_date.year)
-            )
-        elif self.filters.range == "Half-Yearly":
-            period = _("Half Year {0} {1}").format(
-                "1" if posting_date.month <= 6 else "2", str(posting_date.year)
+            conditions += f" AND {alias}.company = %(company)s"
+        if self.filters.get("cost_center") and not month_wise:
+            conditions += f" AND {alias}.cost_center = %(cost_center)s"
+        return conditions
+
+    def get_ste_consumption_transactions(self, from_date, to_date, month_wise=False):
+        conditions = self.get_consumption_conditions("se", month_wise)
+        bucket_columns, bucket_group_by = self.get_bucket_sql("se", month_wise)
+        query = f"""
+            SELECT
+                itm.item_group,
+                {bucket_columns},
+                SUM(sed.amount) as amount
+            FROM `tabStock Entry` se
+            INNER JOIN `tabStock Entry Detail` sed ON se.name = sed.parent
+            INNER JOIN `tabItem` itm ON sed.item_code = itm.name
+            WHERE se.docstatus = 1
+            -- genuine Material Issues, classified on submit
+            AND se.consumption_kind = 'Consumption'
+            AND sed.s_warehouse IS NOT NULL
+            {conditions}
+            GROUP BY itm.item_group, {bucket_group_by}
+        """
+        return frappe.db.sql(query, dict(self.filters, from_date=from_date, to_date=to_date), as_dict=1)
+
+    def get_dn_consumption_transactions(self, from_date, to_date, month_wise=False):
+        conditions = self.get_consumption_conditions("dn", month_wise)
+        bucket_columns, bucket_group_by = self.get_bucket_sql("dn", month_wise)
+        query = f"""
+            SELECT
+                itm.item_group,
+                {bucket_columns},
+                SUM(CASE WHEN dn.is_return = 1 THEN -1 * dni.amount ELSE dni.amount END) as amount
+            FROM `tabDelivery Note` dn
+            INNER JOIN `tabDelivery Note Item` dni ON dn.name = dni.parent
+            INNER JOIN `tabItem` itm ON dni.item_code = itm.name
+            WHERE dn.docstatus = 1
+            AND dni.docstatus = 1
+            {conditions}
+            GROUP BY itm.item_group, {bucket_group_by}
+        """
+        return frappe.db.sql(query, dict(self.filters, from_date=from_date, to_date=to_date), as_dict=1)
+
+    def get_si_consumption_transactions(self, from_date, to_date, month_wise=False):
+        conditions = self.get_consumption_conditions("si", month_wise)
+        bucket_columns, bucket_group_by = self.get_bucket_sql("si", month_wise)
+        query = f"""
+            SELECT
+                itm.item_group,
+                {bucket_columns},
+                SUM(CASE WHEN si.is_return = 1 THEN -1 * sii.amount ELSE sii.amount END) as amount
+            FROM `tabSales Invoice` si
+            INNER JOIN `tabSales Invoice Item` sii ON si.name = sii.parent
+            INNER JOIN `tabItem` itm ON sii.item_code = itm.name
+            WHERE si.docstatus = 1
+            AND sii.docstatus = 1
+            AND si.update_stock = 1
+            {conditions}
+            GROUP BY itm.item_group, {bucket_group_by}
+        """
+        return frappe.db.sql(query, dict(self.filters, from_date=from_date, to_date=to_date), as_dict=1)
+
+    def get_debug_message(self):
+        """Per-source totals of the aggregates this run used, for the `debug` filter"""
+        source_labels = {
+            "orders": _("Purchase Orders"),
+            "receipts": _("Purchase Receipts and Material Receipts"),
+            "stock_entry_consumption": _("Material Issues"),
+            "delivery_note_consumption": _("Delivery Notes"),
+            "sales_invoice_consumption": _("Direct Sales Invoices"),
+        }
+        source_rows = [
+            (source_labels[source], len(entries), sum(flt(e.amount) for e in entries))
+            for source, entries in self.entries_by_source.items()
+        ]
+        source_rows.append((
+            _("Total Consumption"),
+            len(self.consumption_entries),
+            sum(flt(e.amount) for e in self.consumption_entries),
+        ))
+
+        rows = "".join(
+            "<tr><td>{0}</td><td class='text-right'>{1}</td><td class='text-right'>{2}</td></tr>".format(
+                label, count, frappe.format_value(amount, "Currency")
             )
-        else:
-            year = get_fiscal_year(posting_date, company=self.filters.company)
-            period = str(year[0])
-        return period
-
-    def get_period_date_ranges(self):
-        from dateutil.relativedelta import MO, relativedelta
-
-        from_date, to_date = getdate(self.filters.from_date), getdate(self.filters.to_date)
-
-        increment = {"Monthly": 1, "Quarterly": 3, "Half-Yearly": 6, "Yearly": 12}.get(
-            self.filters.range, 1
+            for label, count, amount in source_rows
         )
+        live_ranges = ", ".join(f"{from_date} - {to_date}" for from_date, to_date in self.live_ranges)
+        cached_range = " - ".join(str(month) for month in self.cache_window) if self.cache_window else _("None")
+
+        return f"""
+            <h6>{_("Source Breakdown")}</h6>
+            <table class="table table-bordered table-condensed">
+                <thead><tr>
+                    <th>{_("Source")}</th>
+                    <th class="text-right">{_("Aggregate Rows")}</th>
+                    <th class="text-right">{_("Amount")}</th>
+                </tr></thead>
+                <tbody>{rows}</tbody>
+            </table>
+            <p class="text-muted small">
+                {_("Cached Months")}: {cached_range}<br>
+                {_("Live Ranges")}: {live_ranges or _("None")}
+            </p>
+        """
 
-        if self.filters.range in ["Monthly", "Quarterly"]:
-            from_date = from_date.replace(day=1)
-        elif self.filters.range == "Yearly":
-            from_date = get_fiscal_year(from_date, company=self.filters.company)[1]
-            to_date = get_fiscal_year(to_date, company=self.filters.company)[2]
-        else:
-            from_date = from_date + relativedelta(from_date, weekday=MO(-1))
-
-        self.periodic_daterange = []
-        for dummy in range(1, 53):
-            if self.filters.range == "Weekly":
-                period_end_date = add_days(from_date, 6)
-            else:
-                period_end_date = add_to_date(from_date, months=increment, days=-1)
-
-            if period_end_date > to_date:
-                period_end_date = to_date
-
-            self.periodic_daterange.append(period_end_date)
-
-            from_date = add_days(period_end_date, 1)
-            if period_end_date == to_date:
-                break
+    def get_rows_by_group(self):
+        """Bucket the three measures into one (group x period) matrix and roll it up once.
+
+        Every group owns a flat row of len(MEASURES) * periods cells. Walking the
+        lft-ordered groups in reverse reaches each group after all its descendants,
+        so adding a group's row into its parent's completes the subtree totals.
+        """
+        period_count = len(self.periods)
+        group_index = {d.name: idx for idx, d in enumerate(self.group_entries)}
+        cells = [[0.0] * (len(MEASURES) * period_count) for d in self.group_entries]
+
+        for measure_idx, entries in enumerate(
+            (self.order_entries, self.receipt_entries, self.consumption_entries)
+        ):
+            offset = measure_idx * period_count
+            for d in entries:
+                group_idx = group_index.get(d.item_group)
+                if group_idx is None or d.period_idx is None:
+                    continue
+                period_idx = cint(d.period_idx)
+                if 0 <= period_idx < period_count:
+                    cells[group_idx][offset + period_idx] += flt(d.amount)
+
+        for group_idx in range(len(self.group_entries) - 1, -1, -1):
+            parent_idx = group_index.get(self.group_entries[group_idx].parent)
+            if parent_idx is not None:
+                cells[parent_idx] = list(map(add, cells[parent_idx], cells[group_idx]))
+
+        self.data = []
+        for d, values in zip(self.group_entries, cells):
+            row = {"item_group": d.name, "indent": self.depth_map.get(d.name)}
+            for measure_idx, measure in enumerate(MEASURES):
+                measure_values = values[measure_idx * period_count:(measure_idx + 1) * period_count]
+                for period, amount in zip(self.periods, measure_values):
+                    row[measure + period.key] = amount
+                row[measure + "_total"] = sum(measure_values)
+            self.data.append(row)
 
     def get_groups(self):
         parent = "parent_item_group"
@@ -0,0 +1,92 @@
+import random
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+
+from erpnext.stock.report.mk_project_status.mk_project_status import MEASURES, ProjectAnalytics
+
+
+def make_group_tree(size, seed=0):
+	"""Return `size` item groups in lft order, each group but the root under a random earlier one."""
+	rng = random.Random(seed)
+	parents = {f"Group {idx}": f"Group {rng.randrange(idx)}" for idx in range(1, size)}
+	children = {}
+	for name, parent in parents.items():
+		children.setdefault(parent, []).append(name)
+
+	groups, stack = [], ["Group 0"]
+	while stack:
+		name = stack.pop()
+		groups.append(frappe._dict(name=name, parent=parents.get(name)))
+		stack.extend(reversed(children.get(name, [])))
+	return groups
+
+
+def make_entries(groups, period_count, count, seed=0):
+	rng = random.Random(seed)
+	return [
+		frappe._dict(
+			item_group=rng.choice(groups).name,
+			period_idx=rng.randrange(period_count),
+			amount=rng.randint(1, 100000) / 100,
+		)
+		for _ in range(count)
+	]
+
+
+def make_report(groups, entries_count, **filters):
+	report = ProjectAnalytics(frappe._dict(company="_Test Company", **filters))
+	report.group_entries = groups
+	report.depth_map = {}
+	for d in groups:
+		report.depth_map[d.name] = report.depth_map[d.parent] + 1 if d.parent else 0
+
+	report.order_entries, report.receipt_entries, report.consumption_entries = (
+		make_entries(groups, len(report.periods), entries_count, seed=seed) for seed in range(len(MEASURES))
+	)
+	return report
+
+
+def get_expected_totals(report, entries):
+	"""Subtree totals by walking up every entry's ancestors, independent of the report rollup"""
+	parent_map = {d.name: d.parent for d in report.group_entries}
+	totals = dict.fromkeys(parent_map, 0.0)
+	for d in entries:
+		group = d.item_group
+		while group:
+			totals[group] += d.amount
+			group = parent_map[group]
+	return totals
+
+
+class TestMKProjectStatus(FrappeTestCase):
+	def test_rollup_totals_parity(self):
+		report = make_report(
+			make_group_tree(300), 5000, range="Monthly", from_date="2024-04-01", to_date="2025-03-31"
+		)
+		report.get_rows_by_group()
+		rows = {row["item_group"]: row for row in report.data}
+
+		for measure, entries in zip(
+			MEASURES, (report.order_entries, report.receipt_entries, report.consumption_entries)
+		):
+			expected = get_expected_totals(report, entries)
+			for group, total in expected.items():
+				self.assertAlmostEqual(rows[group][measure + "_total"], total, places=4)
+
+			root = rows["Group 0"]
+			self.assertAlmostEqual(
+				sum(root[measure + period.key] for period in report.periods),
+				sum(d.amount for d in entries),
+				places=4,
+			)
+
+	def test_rollup_large_tree(self):
+		# 2k item groups over 52 weekly periods (2024-01-01 is a Monday)
+		report = make_report(
+			make_group_tree(2000), 20000, range="Weekly", from_date="2024-01-01", to_date="2024-12-29"
+		)
+		self.assertEqual(len(report.periods), 52)
+
+		report.get_rows_by_group()
+		self.assertEqual(len(report.data), 2000)
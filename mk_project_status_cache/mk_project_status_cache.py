@@ -0,0 +1,205 @@
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_months, flt, get_first_day, get_last_day, getdate, now, nowdate
+
+# Closed months the daily job keeps built for every company
+SCHEDULED_MONTHS = 24
+
+# One measure per MK Project Status source query, in the report's fetch order
+MEASURES = (
+    "orders",
+    "receipts",
+    "stock_entry_consumption",
+    "delivery_note_consumption",
+    "sales_invoice_consumption",
+)
+
+
+class MKProjectStatusCache(Document):
+    pass
+
+
+def on_doctype_update():
+    frappe.db.add_unique(
+        "MK Project Status Cache",
+        ["company", "cost_center", "item_group", "month"],
+        constraint_name="unique_company_cost_center_item_group_month",
+    )
+    frappe.db.add_index("MK Project Status Cache", ["company", "month"])
+
+
+def get_cached_months(company, from_date, to_date):
+    """Return the month start dates already built for the company in the range.
+
+    Every built month has a marker row (no cost center or item group), so a month
+    without any source rows still counts as built.
+    """
+    months = frappe.db.sql_list(
+        """
+        SELECT DISTINCT month
+        FROM `tabMK Project Status Cache`
+        WHERE company = %s AND month BETWEEN %s AND %s
+        """,
+        (company, from_date, to_date),
+    )
+    return {getdate(month) for month in months}
+
+
+def get_cached_entries(company, from_date, to_date, periods, cost_center=None, exclude_months=None):
+    """Return the cached totals of the range grouped by item group and report period"""
+    conditions = ""
+    if cost_center:
+        conditions += " AND cost_center = %(cost_center)s"
+    if exclude_months:
+        conditions += " AND month NOT IN %(exclude_months)s"
+
+    measures = ", ".join(f"SUM({measure}) as {measure}" for measure in MEASURES)
+    return frappe.db.sql(
+        f"""
+        SELECT item_group, {periods.get_index_sql("month")} as period_idx, {measures}
+        FROM `tabMK Project Status Cache`
+        WHERE company = %(company)s
+        AND month BETWEEN %(from_date)s AND %(to_date)s
+        AND item_group != ''
+        {conditions}
+        GROUP BY item_group, period_idx
+        """,
+        {
+            "company": company,
+            "from_date": from_date,
+            "to_date": to_date,
+            "cost_center": cost_center,
+            "exclude_months": tuple(exclude_months or ()),
+        },
+        as_dict=1,
+    )
+
+
+def get_missing_months(company, first_month, last_month):
+    cached_months = get_cached_months(company, first_month, last_month)
+    missing_months = []
+    month = getdate(first_month)
+    while month <= getdate(last_month):
+        if month not in cached_months:
+            missing_months.append(month)
+        month = add_months(month, 1)
+    return missing_months
+
+
+def build_months(company, first_month, last_month):
+    """Compute and store the months of the range that are not cached yet.
+
+    Runs as a background job (and from the daily scheduler), never inside a
+    report request: those are read only and may be served by a replica.
+    """
+    from erpnext.stock.report.mk_project_status.mk_project_status import ProjectAnalytics
+
+    # Months a queued repost will revalue are left for after it completes
+    pending_month = get_pending_repost_month(company)
+    missing_months = [
+        month
+        for month in get_missing_months(company, first_month, last_month)
+        if not pending_month or month < pending_month
+    ]
+    if not missing_months:
+        return
+
+    from_date, to_date = missing_months[0], get_last_day(missing_months[-1])
+    report = ProjectAnalytics({"company": company, "from_date": from_date, "to_date": to_date, "range": "Monthly"})
+    entries_by_source = report.run_source_queries([(from_date, to_date)], month_wise=True)
+    store_months(company, missing_months, entries_by_source)
+
+
+def get_pending_repost_month(company):
+    """First month a queued or running Repost Item Valuation of the company will revalue"""
+    posting_date = frappe.db.get_value(
+        "Repost Item Valuation",
+        {"company": company, "docstatus": 1, "status": ("in", ("Queued", "In Progress"))},
+        "min(posting_date)",
+    )
+    return get_first_day(posting_date) if posting_date else None
+
+
+def enqueue_build_months(company, first_month, last_month):
+    """Queue `build_months` for the range, once per company and range"""
+    frappe.enqueue(
+        "erpnext.stock.doctype.mk_project_status_cache.mk_project_status_cache.build_months",
+        queue="long",
+        job_id=f"mk_project_status_cache::{company}::{first_month}::{last_month}",
+        deduplicate=True,
+        company=company,
+        first_month=first_month,
+        last_month=last_month,
+    )
+
+
+def build_project_status_cache():
+    """Daily scheduler event: build the closed months of the last two years for every company"""
+    last_month = get_first_day(add_months(getdate(nowdate()), -1))
+    first_month = add_months(last_month, 1 - SCHEDULED_MONTHS)
+    for company in frappe.get_all("Company", pluck="name"):
+        build_months(company, first_month, last_month)
+
+
+def store_months(company, months, entries_by_measure):
+    """Insert the month-wise source rows (cost_center, item_group, month, amount) of `months`,
+    and a marker row per month so months without any rows are not rebuilt on every run"""
+    months = set(months)
+    totals = {("", "", month): dict.fromkeys(MEASURES, 0.0) for month in months}
+    for measure, entries in entries_by_measure.items():
+        for d in entries:
+            month = getdate(d.month)
+            if month not in months:
+                continue
+            key = (d.cost_center or "", d.item_group, month)
+            totals.setdefault(key, dict.fromkeys(MEASURES, 0.0))[measure] += flt(d.amount)
+
+    if not totals:
+        return
+
+    timestamp, user = now(), frappe.session.user
+    fields = ["name", "creation", "modified", "owner", "modified_by", "docstatus",
+        "company", "cost_center", "item_group", "month", *MEASURES]
+    values = [
+        (frappe.generate_hash(length=10), timestamp, timestamp, user, user, 0,
+            company, cost_center, item_group, month, *(amounts[m] for m in MEASURES))
+        for (cost_center, item_group, month), amounts in totals.items()
+    ]
+    # A concurrent run may have built the same months; the unique key keeps the first copy
+    frappe.db.bulk_insert("MK Project Status Cache", fields, values, ignore_duplicates=True)
+    frappe.db.commit()
+
+
+def invalidate_project_status_cache(doc, method=None):
+    """on_submit / on_cancel of the MK Project Status source doctypes, and of Stock
+    Reconciliation and Landed Cost Voucher, which revalue stock without being a source.
+
+    Only closed months are cached, so this only deletes anything for back-dated
+    documents. Stock transactions are reposted forward, which revalues later
+    material issues, so they invalidate their month and every month after it.
+    """
+    if doc.doctype == "Purchase Order":
+        month = get_first_day(doc.transaction_date)
+    else:
+        month = (">=", get_first_day(doc.posting_date))
+
+    frappe.db.delete("MK Project Status Cache", {"company": doc.company, "month": month})
+
+
+def invalidate_after_repost(doc, method=None):
+    """Repost Item Valuation on_submit: the repost revalues every stock transaction
+    from its posting date on.
+
+    The repost job marks itself Completed through db_set, which runs no hooks, so
+    the months are cleared when it is queued instead, and `build_months` leaves
+    them alone until no repost of the company is pending.
+    """
+    frappe.db.delete(
+        "MK Project Status Cache", {"company": doc.company, "month": (">=", get_first_day(doc.posting_date))}
+    )
+
+
+def clear_project_status_cache(doc, method=None):
+    """Item on_update: moving an item to another group re-attributes its history"""
+    if doc.has_value_changed("item_group"):
+        frappe.db.delete("MK Project Status Cache")
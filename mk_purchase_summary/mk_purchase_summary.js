@@ -40,6 +40,42 @@ frappe.query_reports["MK Purchase Summary"] = {
             fieldname: "item_group",
             fieldtype: "Link",
             options: "Item Group"
+        },
+        {
+            label: __("Supplier Breakdown"),
+            fieldname: "supplier_breakdown",
+            fieldtype: "Check",
+            default: 0
+        },
+        {
+            label: __("Top N Suppliers"),
+            fieldname: "top_n_suppliers",
+            fieldtype: "Int",
+            default: 5,
+            depends_on: "eval:doc.supplier_breakdown",
+            description: __("Per item group; the remaining suppliers are shown as Other Suppliers")
+        },
+        {
+            label: __("Consolidated"),
+            fieldname: "consolidated",
+            fieldtype: "Check",
+            default: 0
+        },
+        {
+            label: __("Companies"),
+            fieldname: "companies",
+            fieldtype: "MultiSelectList",
+            depends_on: "eval:doc.consolidated",
+            get_data: function(txt) {
+                return frappe.db.get_link_options("Company", txt);
+            }
+        },
+        {
+            label: __("Presentation Currency"),
+            fieldname: "presentation_currency",
+            fieldtype: "Link",
+            options: "Currency",
+            description: __("Defaults to the currency of the selected company")
         }
     ],
 
@@ -1,11 +1,15 @@
+from functools import partial
+from operator import add
+
 import frappe
 from frappe import _, scrub
-from frappe.utils import add_days, add_to_date, flt, getdate, fmt_money
+from frappe.utils import cint, flt, fmt_money
 from frappe.query_builder import DocType
 from pypika.functions import Sum
 
-from erpnext.accounts.utils import get_fiscal_year
-from frappe.utils.nestedset import get_descendants_of
+from erpnext.setup.utils import get_exchange_rate
+from erpnext.stock.report.mk_report_utils.concurrency import run_concurrently
+from erpnext.stock.report.mk_report_utils.periods import PeriodBuckets
 
 def execute(filters=None):
     return PurchaseAnalytics(filters).run()
@@ -14,11 +18,22 @@ class PurchaseAnalytics(object):
     def __init__(self, filters=None):
         self.filters = frappe._dict(filters or {})
         self.date_field = "posting_date"
-        self.months = [
-            "Jan", "Feb", "Mar", "Apr", "May", "Jun",
-            "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"
-        ]
-        self.get_period_date_ranges()
+        self.periods = PeriodBuckets(
+            self.filters.from_date,
+            self.filters.to_date,
+            self.filters.range,
+            company=self.filters.company,
+        )
+
+        self.companies = [self.filters.company]
+        if self.filters.get("consolidated") and self.filters.get("companies"):
+            self.companies = frappe.parse_json(self.filters.companies)
+
+        self.currency = self.filters.get("presentation_currency") or frappe.get_cached_value(
+            "Company", self.filters.company, "default_currency"
+        )
+        self.exchange_rates = {}
+        self.top_n_suppliers = cint(self.filters.get("top_n_suppliers")) or 5
 
     def run(self):
         self.get_columns()
@@ -41,13 +56,20 @@ class PurchaseAnalytics(object):
             "width": 200
         }]
 
-        for end_date in self.periodic_daterange:
-            period = self.get_period(end_date)
+        if self.filters.get("supplier_breakdown"):
+            self.columns.append({
+                "label": _("Supplier"),
+                "fieldname": "supplier",
+                "fieldtype": "Data",
+                "width": 180
+            })
+
+        for period in self.periods.labels:
             self.columns.append({
                 "label": _(period),
                 "fieldname": scrub(period),
                 "fieldtype": "Currency",
-                "options": "Company:company:default_currency",
+                "options": "currency",
                 "width": 120
             })
 
@@ -55,19 +77,60 @@ class PurchaseAnalytics(object):
             "label": _("Total"),
             "fieldname": "total",
             "fieldtype": "Currency",
-            "options": "Company:company:default_currency",
+            "options": "currency",
             "width": 120
         })
 
     def get_data(self):
-        self.get_purchase_transactions()
-        
-    def get_purchase_transactions(self):
         self.get_item_groups()
 
+        if len(self.companies) > 1:
+            # One grouped query per company, each on its own connection
+            results = run_concurrently(
+                [partial(self.get_purchase_transactions, company) for company in self.companies]
+            )
+        else:
+            results = [self.get_purchase_transactions(company) for company in self.companies]
+
+        # Item groups are shared across companies, so merging the trees is merging the entries
+        self.entries = []
+        for company, entries in zip(self.companies, results):
+            self.entries.extend(self.convert_to_presentation_currency(company, entries))
+
+    def convert_to_presentation_currency(self, company, entries):
+        company_currency = frappe.get_cached_value("Company", company, "default_currency")
+        if company_currency == self.currency:
+            return entries
+
+        for entry in entries:
+            rate = self.get_period_exchange_rate(company_currency, entry.period_idx)
+            entry.value_field = flt(entry.value_field) * rate
+            entry.tax_field = flt(entry.tax_field) * rate
+        return entries
+
+    def get_period_exchange_rate(self, from_currency, period_idx):
+        """Exchange rate on the last day of the period, looked up once per currency and period"""
+        key = (from_currency, cint(period_idx))
+        if key not in self.exchange_rates:
+            period = self.periods[cint(period_idx)]
+            rate = get_exchange_rate(from_currency, self.currency, period.end_date)
+            if not rate:
+                frappe.throw(
+                    _("Exchange rate from {0} to {1} for {2} is not available").format(
+                        from_currency, self.currency, period.end_date
+                    )
+                )
+            self.exchange_rates[key] = flt(rate)
+        return self.exchange_rates[key]
+
+    def get_purchase_transactions(self, company):
+        if self.filters.get("supplier_breakdown"):
+            return self.get_supplier_transactions(company)
+
         tran = DocType("Purchase Receipt")
         detail = DocType("Purchase Receipt Item")
         item = DocType("Item")
+        period_idx = self.periods.get_index_term(tran.posting_date)
 
         query = (
             frappe.qb.from_(tran)
@@ -79,115 +142,174 @@ class PurchaseAnalytics(object):
                 item.item_group.as_("item_group"),
                 Sum(detail.base_net_amount).as_("value_field"),
                 Sum(detail.item_tax_amount).as_("tax_field"),
-                tran.posting_date.as_("posting_date")
+                period_idx.as_("period_idx")
             )
             .where(
                 (tran.docstatus == 1) & 
-                (tran.company == self.filters.company) &
+                (tran.company == company) &
                 (tran.posting_date.between(self.filters.from_date, self.filters.to_date))
             )
-            .groupby(item.item_group, tran.posting_date)
+            .groupby(item.item_group, period_idx)
         )
 
-        self.entries = query.run(as_dict=True)
+        return query.run(as_dict=True)
+
+    def get_supplier_transactions(self, company):
+        """Receipts per item group, supplier and period, ranked in the database.
+
+        Suppliers are ranked by their spend on each item group over the whole
+        range; all but the top N of every group come back as one row with a
+        NULL supplier, so the result stays small however many lines are scanned.
+        """
+        return frappe.db.sql(
+            f"""
+            WITH spend AS (
+                SELECT
+                    itm.item_group,
+                    pr.supplier,
+                    {self.periods.get_index_sql("pr.posting_date")} AS period_idx,
+                    SUM(pri.base_net_amount) AS value_field,
+                    SUM(pri.item_tax_amount) AS tax_field
+                FROM `tabPurchase Receipt` pr
+                INNER JOIN `tabPurchase Receipt Item` pri ON pri.parent = pr.name
+                INNER JOIN `tabItem` itm ON itm.name = pri.item_code
+                WHERE pr.docstatus = 1
+                AND pr.company = %(company)s
+                AND pr.posting_date BETWEEN %(from_date)s AND %(to_date)s
+                GROUP BY itm.item_group, pr.supplier, period_idx
+            ),
+            ranked AS (
+                SELECT
+                    item_group,
+                    supplier,
+                    ROW_NUMBER() OVER (
+                        PARTITION BY item_group ORDER BY SUM(value_field + tax_field) DESC
+                    ) AS supplier_rank
+                FROM spend
+                GROUP BY item_group, supplier
+            )
+            SELECT
+                spend.item_group,
+                IF(ranked.supplier_rank <= %(top_n)s, spend.supplier, NULL) AS supplier,
+                spend.period_idx,
+                SUM(spend.value_field) AS value_field,
+                SUM(spend.tax_field) AS tax_field
+            FROM spend
+            INNER JOIN ranked
+                ON ranked.item_group = spend.item_group AND ranked.supplier = spend.supplier
+            GROUP BY
+                spend.item_group,
+                IF(ranked.supplier_rank <= %(top_n)s, spend.supplier, NULL),
+                spend.period_idx
+            """,
+            {
+                "company": company,
+                "from_date": self.filters.from_date,
+                "to_date": self.filters.to_date,
+                "top_n": self.top_n_suppliers,
+            },
+            as_dict=True,
+        )
 
     def get_item_groups(self):
-        item_groups = frappe.get_all(
+        self.item_groups = frappe.get_all(
             "Item Group",
             fields=["name", "parent_item_group", "is_group", "lft", "rgt"],
             filters={"docstatus": 0},
             order_by="lft"
         )
 
-        self.item_group_hierarchy = {}
-        for ig in item_groups:
-            self.item_group_hierarchy[ig.name] = {
-                "parent": ig.parent_item_group,
-                "is_group": ig.is_group,
-                "lft": ig.lft,
-                "rgt": ig.rgt
-            }
-
-    def calculate_indent_level(self, item_group):
-        """Calculate the level of nesting for an item group"""
-        level = 0
-        current = item_group
-        while current:
-            parent = self.item_group_hierarchy.get(current, {}).get("parent")
-            if parent:
-                level += 1
-            current = parent
-        return level
+        # Position, parent position and depth of every group, in lft order
+        self.group_index = {ig.name: idx for idx, ig in enumerate(self.item_groups)}
+        self.parent_index = [self.group_index.get(ig.parent_item_group) for ig in self.item_groups]
+        self.depths = []
+        for parent_idx in self.parent_index:
+            self.depths.append(0 if parent_idx is None else self.depths[parent_idx] + 1)
+
+    def build_matrix(self):
+        """Sum the entries into a dense (group x period) matrix rolled up to every ancestor.
+
+        Children follow their parent in lft order, so one reverse walk adding each
+        group's row into its parent's leaves complete subtree totals on every row.
+        """
+        period_count = len(self.periods)
+        self.matrix = [[0.0] * period_count for ig in self.item_groups]
+        self.supplier_matrix = {}
 
-    def process_data_into_tree(self):
-        period_data = {}
-        
-        # First pass: Calculate amounts for each item group
         for entry in self.entries:
-            item_group = entry.item_group
-            if not item_group:
+            group_idx = self.group_index.get(entry.item_group)
+            if group_idx is None or entry.period_idx is None:
                 continue
-                
-            posting_date = getdate(entry.posting_date)
-            period = self.get_period(posting_date)
-            amount = flt(entry.value_field) + flt(entry.tax_field)
-            
-            # Initialize dictionaries
-            if item_group not in period_data:
-                period_data[item_group] = {}
-            if period not in period_data[item_group]:
-                period_data[item_group][period] = 0
-                
-            period_data[item_group][period] += amount
-            
-            # Roll up to parent groups
-            parent = self.item_group_hierarchy.get(item_group, {}).get("parent")
-            while parent:
-                if parent not in period_data:
-                    period_data[parent] = {}
-                if period not in period_data[parent]:
-                    period_data[parent][period] = 0
-                    
-                period_data[parent][period] += amount
-                parent = self.item_group_hierarchy.get(parent, {}).get("parent")
-
-        # Second pass: Create data rows with proper structure
+            period_idx = cint(entry.period_idx)
+            if 0 <= period_idx < period_count:
+                amount = flt(entry.value_field) + flt(entry.tax_field)
+                self.matrix[group_idx][period_idx] += amount
+                if self.filters.get("supplier_breakdown"):
+                    self.supplier_matrix.setdefault(entry.item_group, {}).setdefault(
+                        entry.supplier, [0.0] * period_count
+                    )[period_idx] += amount
+
+        for group_idx in range(len(self.item_groups) - 1, -1, -1):
+            parent_idx = self.parent_index[group_idx]
+            if parent_idx is not None:
+                self.matrix[parent_idx] = list(map(add, self.matrix[parent_idx], self.matrix[group_idx]))
+
+    def process_data_into_tree(self):
+        self.build_matrix()
+
         self.data = []
-        for item_group, periods in period_data.items():
-            indent = self.calculate_indent_level(item_group)
+        for ig, depth, values in zip(self.item_groups, self.depths, self.matrix):
+            total = sum(values)
+            if total <= 0:  # Only include rows with data
+                continue
+
             row = frappe._dict({
-                "name": item_group,
-                "parent": self.item_group_hierarchy.get(item_group, {}).get("parent") or "",
-                "item_group": item_group,
-                "indent": indent
+                "name": ig.name,
+                "parent": ig.parent_item_group or "",
+                "item_group": ig.name,
+                "indent": depth,
+                "currency": self.currency
             })
-            
-            total = 0
-            for period in self.period_list:
-                amount = periods.get(period, 0)
-                row[scrub(period)] = amount
-                total += amount
-            
-            if total > 0:  # Only include rows with data
-                row["total"] = total
-                self.data.append(row)
+            for period, amount in zip(self.periods, values):
+                row[period.key] = amount
+            row["total"] = total
+            self.data.append(row)
 
-        # Sort by lft value to maintain hierarchy
-        self.data.sort(key=lambda x: self.item_group_hierarchy.get(x.item_group, {}).get("lft", 0))
+            if self.filters.get("supplier_breakdown"):
+                self.data.extend(self.get_supplier_rows(ig.name, depth + 1))
+
+    def get_supplier_rows(self, item_group, indent):
+        """Rows of the suppliers directly behind an item group's spend, the tail last"""
+        suppliers = self.supplier_matrix.get(item_group, {})
+        rows = []
+        for supplier in sorted(suppliers, key=lambda s: (s is None, -sum(suppliers[s]))):
+            values = suppliers[supplier]
+            row = frappe._dict({
+                "name": f"{item_group}::{supplier or ''}",
+                "parent": item_group,
+                "supplier": supplier or _("Other Suppliers"),
+                "indent": indent,
+                "currency": self.currency
+            })
+            for period, amount in zip(self.periods, values):
+                row[period.key] = amount
+            row["total"] = sum(values)
+            rows.append(row)
+        return rows
 
     def apply_item_group_filter_to_entries(self):
         """Apply item group filter to raw entries"""
-        selected_group = self.filters.item_group
-        is_group = self.item_group_hierarchy.get(selected_group, {}).get("is_group", 0)
-        
-        if is_group:
-            # If it's a group, include children
-            children = get_descendants_of("Item Group", selected_group, ignore_permissions=True)
-            allowed_groups = [selected_group] + children
-        else:
-            # If it's a leaf node, just include itself
-            allowed_groups = [selected_group]
-            
+        idx = self.group_index.get(self.filters.item_group)
+        if idx is None:
+            # A disabled or unknown group has no rows to show
+            self.entries = []
+            return
+        selected = self.item_groups[idx]
+
+        # The selected group and its descendants share its lft-rgt range
+        allowed_groups = {
+            ig.name for ig in self.item_groups if selected.lft <= ig.lft <= selected.rgt
+        }
         self.entries = [e for e in self.entries if e.get("item_group") in allowed_groups]
 
     def get_chart_data(self):
@@ -195,19 +317,15 @@ class PurchaseAnalytics(object):
         labels = []
         values = []
         tooltips = []
-        currency = frappe.get_cached_value('Company', self.filters.company, 'default_currency')
+        currency = self.currency
 
-        for end_date in self.periodic_daterange:
-            period = self.get_period(end_date)
-            period_name = scrub(period)
-            
-            # Get all entries for this period
-            period_total = sum(
-                flt(entry.value_field) + flt(entry.tax_field)
-                for entry in self.entries
-                if self.get_period(entry.posting_date) == period
-            )
-            
+        # The root rows of the rolled up matrix already hold the period totals
+        period_totals = [0.0] * len(self.periods)
+        for parent_idx, row in zip(self.parent_index, self.matrix):
+            if parent_idx is None:
+                period_totals = list(map(add, period_totals, row))
+
+        for period, period_total in zip(self.periods.labels, period_totals):
             labels.append(period)
             values.append(period_total)
             tooltips.append(fmt_money(period_total, 2, currency))
@@ -225,60 +343,3 @@ class PurchaseAnalytics(object):
             "fieldtype": "Currency",
             "colors": ["#5e64ff"]
         } if values else None
-
-    def get_period(self, posting_date):
-        if isinstance(posting_date, str):
-            posting_date = getdate(posting_date)
-
-        try:
-            if self.filters.range == "Weekly":
-                period = "Week {0} {1}".format(
-                    str(posting_date.isocalendar()[1]), str(posting_date.year)
-                )
-            elif self.filters.range == "Monthly":
-                period = str(self.months[posting_date.month - 1]) + " " + str(posting_date.year)
-            elif self.filters.range == "Quarterly":
-                period = "Quarter {} {}".format(
-                    str(((posting_date.month - 1) // 3) + 1), str(posting_date.year)
-                )
-            else:
-                year = get_fiscal_year(posting_date, company=self.filters.company)
-                period = str(year[0])
-            return period
-        except Exception:
-            return None
-
-    def get_period_date_ranges(self):
-        from dateutil.relativedelta import MO, relativedelta
-        
-        from_date = getdate(self.filters.from_date)
-        to_date = getdate(self.filters.to_date)
-
-        increment = {"Monthly": 1, "Quarterly": 3, "Half-Yearly": 6, "Yearly": 12}.get(
-            self.filters.range, 1
-        )
-
-        if self.filters.range in ["Monthly", "Quarterly"]:
-            from_date = from_date.replace(day=1)
-        elif self.filters.range == "Yearly":
-            from_date = get_fiscal_year(from_date)[1]
-        else:
-            from_date = from_date + relativedelta(from_date, weekday=MO(-1))
-
-        self.periodic_daterange = []
-        for dummy in range(1, 53):
-            if self.filters.range == "Weekly":
-                period_end_date = add_days(from_date, 6)
-            else:
-                period_end_date = add_to_date(from_date, months=increment, days=-1)
-
-            if period_end_date > to_date:
-                period_end_date = to_date
-
-            self.periodic_daterange.append(period_end_date)
-
-            from_date = add_days(period_end_date, 1)
-            if period_end_date == to_date:
-                break
-                
-        self.period_list = [self.get_period(end_date) for end_date in self.periodic_daterange]
\ No newline at end of file
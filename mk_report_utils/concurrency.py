@@ -0,0 +1,30 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import frappe
+
+
+def run_concurrently(fetchers, max_workers=None):
+    """Run independent read-only callables in parallel and return their results in order.
+
+    Every worker thread opens its own database connection to the current site and
+    runs as the current user, so the queries execute side by side on the server.
+    Workers cannot see uncommitted writes of the calling request, which makes this
+    suitable for report reads only.
+    """
+    site = frappe.local.site
+    sites_path = frappe.local.sites_path
+    user = frappe.session.user
+    lang = frappe.local.lang
+
+    def run(fetch):
+        frappe.init(site=site, sites_path=sites_path)
+        try:
+            frappe.connect()
+            frappe.set_user(user)
+            frappe.local.lang = lang
+            return fetch()
+        finally:
+            frappe.destroy()
+
+    with ThreadPoolExecutor(max_workers=max_workers or len(fetchers)) as executor:
+        return list(executor.map(run, fetchers))
@@ -0,0 +1,69 @@
+import frappe
+from frappe.custom.doctype.custom_field.custom_field import create_custom_fields
+
+CONSUMPTION = "Consumption"
+OTHER = "Other"
+
+
+def create_consumption_kind_field():
+    create_custom_fields(
+        {
+            "Stock Entry": [
+                {
+                    "fieldname": "consumption_kind",
+                    "label": "Consumption Kind",
+                    "fieldtype": "Select",
+                    "options": f"\n{CONSUMPTION}\n{OTHER}",
+                    "insert_after": "purpose",
+                    "read_only": 1,
+                    "no_copy": 1,
+                    "print_hide": 1,
+                    "search_index": 1,
+                }
+            ]
+        },
+        update=True,
+    )
+    frappe.db.add_index("Stock Entry", ["consumption_kind", "posting_date"])
+
+
+def get_consumption_kind(doc):
+    """Return whether a Stock Entry is a genuine material issue (consumption).
+
+    A consumption is a Material Issue named MI-* with no target warehouse on any
+    row, i.e. stock that leaves the books instead of moving between warehouses.
+    """
+    if (
+        doc.purpose == "Material Issue"
+        and doc.name.startswith("MI-")
+        and not any(d.t_warehouse for d in doc.get("items"))
+    ):
+        return CONSUMPTION
+    return OTHER
+
+
+def set_consumption_kind(doc, method=None):
+    """Stock Entry `before_submit` hook, registered in the app's doc_events."""
+    doc.consumption_kind = get_consumption_kind(doc)
+
+
+def backfill_consumption_kind():
+    """Classify the Stock Entries submitted before the hook existed, in one statement."""
+    frappe.db.sql(
+        """
+        UPDATE `tabStock Entry` se
+        SET se.consumption_kind = CASE
+            WHEN se.purpose = 'Material Issue'
+                AND se.name LIKE 'MI-%%'
+                AND NOT EXISTS (
+                    SELECT 1 FROM `tabStock Entry Detail` sed
+                    WHERE sed.parent = se.name
+                    AND sed.t_warehouse IS NOT NULL
+                )
+            THEN %(consumption)s
+            ELSE %(other)s
+        END
+        WHERE se.docstatus = 1
+        """,
+        {"consumption": CONSUMPTION, "other": OTHER},
+    )
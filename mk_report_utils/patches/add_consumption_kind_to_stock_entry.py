@@ -0,0 +1,9 @@
+from erpnext.stock.report.mk_report_utils.consumption import (
+    backfill_consumption_kind,
+    create_consumption_kind_field,
+)
+
+
+def execute():
+    create_consumption_kind_field()
+    backfill_consumption_kind()
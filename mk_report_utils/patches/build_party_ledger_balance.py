@@ -0,0 +1,7 @@
+from erpnext.stock.doctype.mk_party_ledger_balance.mk_party_ledger_balance import (
+    rebuild_party_ledger_balance,
+)
+
+
+def execute():
+    rebuild_party_ledger_balance()
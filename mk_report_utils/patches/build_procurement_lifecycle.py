@@ -0,0 +1,7 @@
+from erpnext.stock.doctype.mk_procurement_lifecycle.mk_procurement_lifecycle import (
+    refresh_procurement_lifecycle,
+)
+
+
+def execute():
+    refresh_procurement_lifecycle()
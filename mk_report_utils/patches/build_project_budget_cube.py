@@ -0,0 +1,29 @@
+import frappe
+from frappe.utils import nowdate
+
+from erpnext.stock.doctype.mk_project_budget_cube.mk_project_budget_cube import (
+    rebuild_project_budget_cube,
+    update_budget_in_cube,
+)
+
+
+def execute():
+    for company in frappe.get_all("Company", pluck="name"):
+        first_date = frappe.db.sql(
+            """
+            SELECT MIN(posting_date) FROM `tabStock Ledger Entry`
+            WHERE company = %s AND is_cancelled = 0
+            """,
+            company,
+        )[0][0]
+        first_order_date = frappe.db.get_value(
+            "Purchase Order", {"company": company, "docstatus": 1}, "min(transaction_date)"
+        )
+        first_date = min(filter(None, [first_date, first_order_date]), default=None)
+        if first_date:
+            rebuild_project_budget_cube(company, first_date, nowdate())
+
+    for name in frappe.get_all(
+        "Budget", filters={"docstatus": 1, "budget_against": "Cost Center"}, pluck="name"
+    ):
+        update_budget_in_cube(frappe.get_doc("Budget", name))
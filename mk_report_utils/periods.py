@@ -0,0 +1,162 @@
+from bisect import bisect_right
+
+import frappe
+from frappe import _, scrub
+from frappe.utils import add_days, add_months, cint, getdate
+from pypika.terms import LiteralValue
+
+from erpnext.accounts.utils import get_fiscal_year
+
+MONTHS = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+RANGE_MONTHS = {"Monthly": 1, "Quarterly": 3, "Half-Yearly": 6, "Yearly": 12}
+
+
+class PeriodBuckets:
+    """Period boundaries and labels of a report range, computed once per run.
+
+    Dates are mapped to periods by bisecting the sorted period start dates, so
+    bucketing a row costs one binary search instead of formatting a label (and,
+    in Yearly mode, looking up the fiscal year) for every transaction.
+
+    Weeks follow the calendar and years the company's fiscal years, unless
+    `anchored` is set: then weeks are seven-day windows from the start of the
+    range and years twelve-month windows from its month.
+    """
+
+    def __init__(self, from_date, to_date, range, company=None, labeler=None, max_periods=None, anchored=False):
+        self.from_date = getdate(from_date)
+        self.to_date = getdate(to_date)
+        self.range = range or "Monthly"
+        self.company = company
+        self.anchored = anchored
+        self.labeler = labeler or self.get_label
+        self.fiscal_years = {}
+
+        self.periods = []
+        self.set_periods(max_periods)
+        self.start_dates = [period.start_date for period in self.periods]
+        self.labels = [period.label for period in self.periods]
+
+    def __iter__(self):
+        return iter(self.periods)
+
+    def __len__(self):
+        return len(self.periods)
+
+    def __getitem__(self, index):
+        return self.periods[index]
+
+    def set_periods(self, max_periods=None):
+        period_start = self.first_period_start = self.get_first_start_date()
+        while period_start <= self.to_date and not (max_periods and len(self.periods) >= max_periods):
+            # The first and last periods are clipped to the report range
+            start_date = max(period_start, self.from_date)
+            end_date = min(self.get_end_date(period_start), self.to_date)
+            label = self.labeler(start_date, end_date)
+            self.periods.append(
+                frappe._dict(
+                    idx=len(self.periods),
+                    start_date=start_date,
+                    end_date=end_date,
+                    label=label,
+                    key=scrub(label),
+                )
+            )
+            period_start = add_days(end_date, 1)
+
+    def get_first_start_date(self):
+        if self.range == "Weekly":
+            return self.from_date if self.anchored else add_days(self.from_date, -self.from_date.weekday())
+        elif self.is_fiscal_year():
+            return self.get_fiscal_year(self.from_date)[1]
+        return self.from_date.replace(day=1)
+
+    def get_end_date(self, start_date):
+        if self.range == "Weekly":
+            return add_days(start_date, 6)
+        elif self.is_fiscal_year():
+            return self.get_fiscal_year(start_date)[2]
+        return add_days(add_months(start_date, RANGE_MONTHS.get(self.range, 1)), -1)
+
+    def is_fiscal_year(self):
+        return self.range == "Yearly" and not self.anchored
+
+    def get_fiscal_year(self, date):
+        if date not in self.fiscal_years:
+            self.fiscal_years[date] = get_fiscal_year(date, company=self.company)
+        return self.fiscal_years[date]
+
+    def get_label(self, start_date, end_date):
+        if self.range == "Weekly":
+            # ISO week and ISO year, so the week ending on 1 January keeps last year's number
+            iso_year, iso_week = end_date.isocalendar()[:2]
+            return _("Week {0} {1}").format(str(iso_week), str(iso_year))
+        elif self.range == "Monthly":
+            return _(MONTHS[end_date.month - 1]) + " " + str(end_date.year)
+        elif self.range == "Quarterly":
+            return _("Quarter {0} {1}").format(str(((end_date.month - 1) // 3) + 1), str(end_date.year))
+        elif self.range == "Half-Yearly":
+            return _("Half Year {0} {1}").format("1" if end_date.month <= 6 else "2", str(end_date.year))
+        elif self.anchored:
+            return str(start_date.year)
+        return str(self.get_fiscal_year(start_date)[0])
+
+    def get_index_sql(self, column):
+        """Return an SQL expression for the period index of the date `column`.
+
+        Grouping by this expression lets the database aggregate rows per period;
+        it yields the same index as `index` for every date in the report range.
+        """
+        if not self.periods:
+            return "NULL"
+
+        if self.range == "Weekly":
+            return f"FLOOR(DATEDIFF({column}, '{self.first_period_start}') / 7)"
+        elif self.is_fiscal_year():
+            # Fiscal years need not be twelve calendar months, so match their bounds
+            cases = " ".join(
+                f"WHEN {column} BETWEEN '{period.start_date}' AND '{period.end_date}' THEN {period.idx}"
+                for period in self.periods
+            )
+            return f"CASE {cases} END"
+
+        return "PERIOD_DIFF(EXTRACT(YEAR_MONTH FROM {0}), {1}) DIV {2}".format(
+            column, self.first_period_start.strftime("%Y%m"), RANGE_MONTHS.get(self.range, 1)
+        )
+
+    def get_index_term(self, field):
+        """Query builder version of `get_index_sql` for `field`."""
+        return LiteralValue(self.get_index_sql(field.get_sql(with_namespace=True, quote_char="`")))
+
+    def label_at(self, idx):
+        """Return the label of the period at `idx`, or None when it is out of range."""
+        if idx is None or not 0 <= cint(idx) < len(self.periods):
+            return None
+        return self.periods[cint(idx)].label
+
+    def index(self, posting_date):
+        """Return the index of the period containing `posting_date`, or None."""
+        if not posting_date:
+            return None
+
+        posting_date = getdate(posting_date)
+        idx = bisect_right(self.start_dates, posting_date) - 1
+        if idx < 0 or posting_date > self.periods[idx].end_date:
+            return None
+        return idx
+
+    def indices(self, posting_dates):
+        return [self.index(posting_date) for posting_date in posting_dates]
+
+    def get(self, posting_date):
+        idx = self.index(posting_date)
+        return None if idx is None else self.periods[idx]
+
+    def label(self, posting_date):
+        period = self.get(posting_date)
+        return period.label if period else None
+
+
+def get_month_start_sql(column):
+    """Return an SQL expression for the first day of the month of the date `column`."""
+    return f"DATE_SUB({column}, INTERVAL DAYOFMONTH({column}) - 1 DAY)"
@@ -0,0 +1,68 @@
+import frappe
+from frappe.utils import flt
+
+
+class SparsePivot:
+    """Sparse row x column totals stored as a dict of dicts.
+
+    Only non-zero cells are kept, so building, rolling up and serialising the pivot
+    costs O(non-zero cells) instead of O(rows x columns).
+    """
+
+    def __init__(self):
+        self.cells = frappe._dict()
+
+    def add(self, row, column, value):
+        value = flt(value)
+        if not value:
+            return
+
+        row_cells = self.cells.setdefault(row, {})
+        row_cells[column] = row_cells.get(column, 0.0) + value
+
+    def get(self, row, column, default=0.0):
+        return self.cells.get(row, {}).get(column, default)
+
+    def row(self, row):
+        return self.cells.get(row, {})
+
+    def rollup(self, nodes):
+        """Add every row into its parent, once, walking `nodes` bottom-up.
+
+        `nodes` must be ordered by `lft` and carry `name` and `parent`; a child is
+        therefore complete before it is added to its parent.
+        """
+        for d in reversed(nodes):
+            if not d.parent or d.name not in self.cells:
+                continue
+
+            parent_cells = self.cells.setdefault(d.parent, {})
+            for column, value in self.cells[d.name].items():
+                parent_cells[column] = parent_cells.get(column, 0.0) + value
+
+    def column_totals(self, rows=None):
+        totals = {}
+        for row in self.cells if rows is None else rows:
+            for column, value in self.row(row).items():
+                totals[column] = totals.get(column, 0.0) + value
+
+        return totals
+
+    def fold_columns(self, keep, other_column):
+        """Move every column not in `keep` into `other_column`."""
+        keep = set(keep)
+        for row, row_cells in self.cells.items():
+            folded = {}
+            for column, value in row_cells.items():
+                column = column if column in keep else other_column
+                folded[column] = folded.get(column, 0.0) + value
+
+            self.cells[row] = folded
+
+
+def get_top_columns(totals, top_n):
+    """Return the `top_n` columns with the largest absolute total, or all when unset."""
+    if not top_n or top_n >= len(totals):
+        return list(totals)
+
+    return sorted(totals, key=lambda column: abs(totals[column]), reverse=True)[:top_n]
@@ -0,0 +1,45 @@
+import frappe
+from frappe import scrub
+
+
+def join_subtree(query, field, tree_doctype, root, include_root=True, alias=None):
+    """Restrict `query` to rows whose `field` is `root` or one of its descendants.
+
+    The tree table is joined twice, once for the node `field` points at and once for
+    `root`, and the node is kept when its `lft` falls between the root's `lft` and `rgt`.
+    Unlike an `IN (...)` list built from `get_descendants_of`, the query text has the
+    same size for every subtree and the range can be served by the `lft` index.
+    """
+    alias = alias or scrub(tree_doctype)
+    node = frappe.qb.DocType(tree_doctype).as_(f"{alias}_node")
+    anchor = frappe.qb.DocType(tree_doctype).as_(f"{alias}_root")
+
+    if include_root:
+        in_range = node.lft.between(anchor.lft, anchor.rgt)
+    else:
+        in_range = (node.lft > anchor.lft) & (node.rgt < anchor.rgt)
+
+    return (
+        query.inner_join(node)
+        .on(node.name == field)
+        .inner_join(anchor)
+        .on((anchor.name == root) & in_range)
+    )
+
+
+def filter_subtree_rows(rows, nodes, root, fieldname):
+    """Keep the report rows whose `fieldname` is `root` or one of its descendants.
+
+    `nodes` are the tree records (with `name`, `lft` and `rgt`) the report has already
+    loaded, so the subtree is resolved without another round trip to the database.
+    """
+    lft_map = {d.name: d.lft for d in nodes}
+    root_node = next((d for d in nodes if d.name == root), None)
+    if not root_node:
+        return []
+
+    return [
+        row
+        for row in rows
+        if root_node.lft <= lft_map.get(row.get(fieldname), 0) <= root_node.rgt
+    ]
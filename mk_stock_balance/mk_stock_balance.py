@@ -10,11 +10,11 @@ from frappe import _
 from frappe.query_builder import Order
 from frappe.query_builder.functions import Coalesce
 from frappe.utils import add_days, cint, date_diff, flt, getdate
-from frappe.utils.nestedset import get_descendants_of
 
 import erpnext
 from erpnext.stock.doctype.inventory_dimension.inventory_dimension import get_inventory_dimensions
 from erpnext.stock.doctype.warehouse.warehouse import apply_warehouse_filter
+from erpnext.stock.report.mk_report_utils.tree import join_subtree
 from erpnext.stock.utils import add_additional_uom_columns
 
 
@@ -305,8 +305,7 @@ class StockBalanceReport:
 
     def apply_items_filters(self, query, item_table) -> str:
         if item_group := self.filters.get("item_group"):
-            children = get_descendants_of("Item Group", item_group, ignore_permissions=True)
-            query = query.where(item_table.item_group.isin([*children, item_group]))
+            query = join_subtree(query, item_table.item_group, "Item Group", item_group)
 
         for field in ["item_code", "brand"]:
             if not self.filters.get(field):
@@ -41,6 +41,12 @@ frappe.query_reports["MK Tally Summary"] = {
             "options": "Weekly\nMonthly\nQuarterly\nYearly",
             "default": "Monthly",
             "reqd": 1
+        },
+        {
+            "fieldname": "compare_with_previous_year",
+            "label": __("Compare with Previous Year"),
+            "fieldtype": "Check",
+            "default": 0
         }
     ],
     
@@ -1,6 +1,8 @@
 import frappe
 from frappe import _
-from frappe.utils import getdate, add_months, add_days, add_to_date, get_first_day, get_last_day, format_date
+from frappe.utils import add_months, flt, format_date, getdate
+
+from erpnext.stock.report.mk_report_utils.periods import PeriodBuckets
 
 # Define allowed supplier groups at module level
 ALLOWED_GROUPS = ["Admin Expenses", "Labour Expenses", "Plant & Machinery Repair, Maintenance-Mk One"]
@@ -10,10 +12,11 @@ def execute(filters=None):
         filters = {}
     
     validate_filters(filters)
-    columns = get_columns(filters)
-    data = get_data(filters)
+    periods = get_period_date_ranges(filters)
+    columns = get_columns(filters, periods)
+    data = get_data(filters, periods)
 
-    chart_data = get_chart_data(columns, data)
+    chart_data = get_chart_data(filters, data, periods)
     return columns, data, None, chart_data
 
 def validate_filters(filters):
@@ -32,40 +35,19 @@ def validate_filters(filters):
     if filters.get("supplier_group") and filters.get("supplier_group") not in ALLOWED_GROUPS:
         frappe.throw(_("Selected Supplier Group must be one of the allowed groups"))
 
-def get_period_date_ranges(filters):
-    ranges = []
-    period_start_date = getdate(filters.from_date)
-    end_date = getdate(filters.to_date)
-
-    while period_start_date <= end_date:
-        if filters.period == "Weekly":
-            period_end_date = add_days(period_start_date, 6)
-        elif filters.period == "Monthly":
-            period_end_date = get_last_day(period_start_date)
-        elif filters.period == "Quarterly":
-            period_end_date = get_last_day(add_months(period_start_date, 2))
-        else:  # Yearly
-            period_end_date = get_last_day(add_months(period_start_date, 11))
-
-        if period_end_date > end_date:
-            period_end_date = end_date
-
-        ranges.append({
-            "start_date": period_start_date,
-            "end_date": period_end_date,
-            "label": get_period_label(period_start_date, period_end_date, filters.period)
-        })
-
-        if filters.period == "Weekly":
-            period_start_date = add_days(period_end_date, 1)
-        elif filters.period == "Monthly":
-            period_start_date = add_months(period_start_date, 1)
-        elif filters.period == "Quarterly":
-            period_start_date = add_months(period_start_date, 3)
-        else:  # Yearly
-            period_start_date = add_months(period_start_date, 12)
+    if filters.get("compare_with_previous_year") and getdate(add_months(filters.get("to_date"), -12)) >= getdate(filters.get("from_date")):
+        frappe.throw(_("Compare with Previous Year needs a date range of one year or less"))
 
-    return ranges
+def get_period_date_ranges(filters):
+    # Weeks are seven-day windows from From Date and years twelve months from its
+    # month, rather than calendar weeks and fiscal years
+    return PeriodBuckets(
+        filters.from_date,
+        filters.to_date,
+        filters.period,
+        labeler=lambda start_date, end_date: get_period_label(start_date, end_date, filters.period),
+        anchored=True,
+    )
 
 def get_period_label(start_date, end_date, period):
     if period == "Weekly":
@@ -77,7 +59,7 @@ def get_period_label(start_date, end_date, period):
     else:  # Yearly
         return str(start_date.year)
 
-def get_columns(filters):
+def get_columns(filters, periods):
     columns = [
         {
             "fieldname": "supplier_name",
@@ -88,121 +70,147 @@ def get_columns(filters):
         }
     ]
 
-    # Add columns for each period
-    periods = get_period_date_ranges(filters)
-    for period in periods:
+    # Add columns for each period, and the total
+    for fieldname, label in [(get_period_fieldname(period), period["label"]) for period in periods] + [("total", _("Total"))]:
         columns.append({
-            "fieldname": f"period_{period['start_date'].strftime('%Y%m%d')}",
-            "label": period["label"],
+            "fieldname": fieldname,
+            "label": label,
             "fieldtype": "Currency",
             "width": 130
         })
 
-    # Add total column
-    columns.append({
-        "fieldname": "total",
-        "label": _("Total"),
-        "fieldtype": "Currency",
-        "width": 130
-    })
+        if filters.get("compare_with_previous_year"):
+            columns.append({
+                "fieldname": f"{fieldname}_previous",
+                "label": _("{0} Previous Year").format(label),
+                "fieldtype": "Currency",
+                "width": 130
+            })
+            columns.append({
+                "fieldname": f"{fieldname}_delta",
+                "label": _("{0} Change").format(label),
+                "fieldtype": "Currency",
+                "width": 130
+            })
 
     return columns
 
-def get_data(filters):
-    # Get target supplier groups based on filters
-    target_groups = []
-    if filters.get("supplier_group"):
-        # If supplier_group is selected, use only that group and its descendants
-        target_groups = [filters.get("supplier_group")] + get_descendant_supplier_groups(filters.get("supplier_group"))
-    else:
-        # If no supplier_group selected, use all allowed groups and their descendants
-        for group in ALLOWED_GROUPS:
-            target_groups.extend([group] + get_descendant_supplier_groups(group))
-        target_groups = list(set(target_groups))  # Remove duplicates
-
-    # Get periods for column generation
-    periods = get_period_date_ranges(filters)
+def get_period_fieldname(period):
+    return f"period_{period['start_date'].strftime('%Y%m%d')}"
+
+def get_supplier_group_condition():
+    """Restrict `sg` (Supplier Group) to the subtrees of the selected or allowed groups"""
+    return """EXISTS (
+        SELECT 1 FROM `tabSupplier Group` root
+        WHERE root.name IN %(supplier_groups)s
+        AND sg.lft BETWEEN root.lft AND root.rgt
+    )"""
+
+def get_data(filters, periods):
+    # The selected supplier group or, by default, all allowed groups, with their descendants
+    compare = filters.get("compare_with_previous_year")
+    params = {
+        "supplier_groups": [filters.get("supplier_group")] if filters.get("supplier_group") else ALLOWED_GROUPS,
+        "from_date": filters.get("from_date"),
+        "to_date": filters.get("to_date"),
+        "previous_from_date": add_months(filters.get("from_date"), -12),
+        "previous_to_date": add_months(filters.get("to_date"), -12),
+    }
 
     # Get suppliers from target groups
-    suppliers = frappe.get_all(
-        "Supplier",
-        fields=["name", "supplier_name", "supplier_group"],
-        filters={"supplier_group": ["in", target_groups]}
-    )
+    suppliers = frappe.db.sql("""
+        SELECT sup.name, sup.supplier_name
+        FROM `tabSupplier` sup
+        INNER JOIN `tabSupplier Group` sg ON sg.name = sup.supplier_group
+        WHERE {condition}
+    """.format(condition=get_supplier_group_condition()), params, as_dict=1)
+
+    # One scan of the payments, summed per supplier, period and year offset. Last
+    # year's payments are shifted forward a year into this year's buckets.
+    shifted_date = """IF(pe.posting_date < %(from_date)s,
+        DATE_ADD(pe.posting_date, INTERVAL 1 YEAR), pe.posting_date)"""
+    date_condition = "pe.posting_date BETWEEN %(from_date)s AND %(to_date)s"
+    if compare:
+        date_condition += " OR pe.posting_date BETWEEN %(previous_from_date)s AND %(previous_to_date)s"
+    payments = frappe.db.sql("""
+        SELECT
+            pe.party,
+            {period_idx} as period_idx,
+            IF(pe.posting_date < %(from_date)s, 1, 0) as year_offset,
+            SUM(pe.paid_amount) as paid_amount
+        FROM `tabPayment Entry` pe
+        INNER JOIN `tabSupplier` sup ON sup.name = pe.party
+        INNER JOIN `tabSupplier Group` sg ON sg.name = sup.supplier_group
+        WHERE pe.party_type = 'Supplier'
+            AND pe.payment_type = 'Pay'
+            AND pe.docstatus = 1
+            AND ({date_condition})
+            AND {condition}
+        GROUP BY pe.party, period_idx, year_offset
+    """.format(
+        period_idx=periods.get_index_sql(shifted_date),
+        date_condition=date_condition,
+        condition=get_supplier_group_condition(),
+    ), params, as_dict=1)
+
+    fieldnames = [get_period_fieldname(period) for period in periods]
+    paid_amounts = {}
+    for d in payments:
+        if d.period_idx is not None:
+            paid_amounts[(d.party, int(d.period_idx), int(d.year_offset))] = flt(d.paid_amount)
 
     data = []
     for supplier in suppliers:
         row = {"supplier_name": supplier.supplier_name}
-        total = 0
-
-        for period in periods:
-            # Get payment entries for this period
-            period_total = frappe.db.sql("""
-                SELECT 
-                    COALESCE(SUM(
-                        CASE 
-                            WHEN pe.payment_type = 'Pay' THEN pe.paid_amount
-                            ELSE 0
-                        END
-                    ), 0) as paid_amount
-                FROM `tabPayment Entry` pe
-                WHERE pe.party_type = 'Supplier'
-                    AND pe.party = %s
-                    AND pe.docstatus = 1
-                    AND pe.posting_date BETWEEN %s AND %s
-            """, (supplier.name, period["start_date"], period["end_date"]), as_dict=1)
-
-            amount = period_total[0].paid_amount if period_total else 0
-            fieldname = f"period_{period['start_date'].strftime('%Y%m%d')}"
+        total = previous_total = 0
+
+        for idx, fieldname in enumerate(fieldnames):
+            amount = paid_amounts.get((supplier.name, idx, 0), 0)
             row[fieldname] = amount
             total += amount
 
+            if compare:
+                previous_amount = paid_amounts.get((supplier.name, idx, 1), 0)
+                row[f"{fieldname}_previous"] = previous_amount
+                row[f"{fieldname}_delta"] = amount - previous_amount
+                previous_total += previous_amount
+
         row["total"] = total
+        if compare:
+            row["total_previous"] = previous_total
+            row["total_delta"] = total - previous_total
         data.append(row)
 
     return sorted(data, key=lambda x: x["total"], reverse=True)
 
-def get_descendant_supplier_groups(group_name):
-    """Get all descendant supplier groups for a given supplier group"""
-    lft, rgt = frappe.db.get_value('Supplier Group', group_name, ['lft', 'rgt'])
-    if not (lft and rgt):
-        return []
-
-    descendants = frappe.db.sql("""
-        SELECT name
-        FROM `tabSupplier Group`
-        WHERE lft > %s AND rgt < %s
-    """, (lft, rgt), as_dict=1)
-
-    return [d.name for d in descendants]
-
-def get_chart_data(columns, data):
+def get_chart_data(filters, data, periods):
     if not data:
         return None
 
-    period_columns = columns[1:-1]  # Exclude supplier_name and total columns
-    labels = [col['label'] for col in period_columns]
-    
+    labels = [period["label"] for period in periods]
+
     # Calculate period totals
-    period_totals = []
-    for col in period_columns:
-        total = sum(row.get(col['fieldname'], 0) for row in data)
-        period_totals.append(total)
+    datasets = [{
+        "name": _("Payment Total"),
+        "values": [sum(row.get(get_period_fieldname(period), 0) for row in data) for period in periods]
+    }]
+    if filters.get("compare_with_previous_year"):
+        datasets.append({
+            "name": _("Previous Year"),
+            "values": [sum(row.get(get_period_fieldname(period) + "_previous", 0) for row in data) for period in periods]
+        })
 
     chart = {
         "data": {
             "labels": labels,
-            "datasets": [{
-                "name": _("Payment Total"),
-                "values": period_totals
-            }]
+            "datasets": datasets
         },
         "type": "bar",
         "fieldtype": "Currency",
-        "colors": ["#5e64ff"],
+        "colors": ["#5e64ff", "#ffa00a"],
         "barOptions": {
             "spaceRatio": 0.2
         }
     }
 
-    return chart
\ No newline at end of file
+    return chart
@@ -0,0 +1,52 @@
+frappe.query_reports["MK Three Way Match"] = {
+	"filters": [
+		{
+			fieldname: "company",
+			label: __("Company"),
+			fieldtype: "Link",
+			options: "Company",
+			default: frappe.defaults.get_user_default("Company"),
+			reqd: 1
+		},
+		{
+			fieldname: "from_date",
+			label: __("From Date"),
+			fieldtype: "Date",
+			default: frappe.datetime.month_start(),
+			reqd: 1
+		},
+		{
+			fieldname: "to_date",
+			label: __("To Date"),
+			fieldtype: "Date",
+			default: frappe.datetime.month_end(),
+			reqd: 1
+		},
+		{
+			fieldname: "supplier",
+			label: __("Supplier"),
+			fieldtype: "Link",
+			options: "Supplier"
+		},
+		{
+			fieldname: "status",
+			label: __("Status"),
+			fieldtype: "Select",
+			options: "\nMatched\nPartly Billed\nUnbilled\nNo Order\nQty Mismatch\nRate Mismatch"
+		},
+		{
+			fieldname: "exceptions_only",
+			label: __("Exceptions Only"),
+			fieldtype: "Check",
+			description: __("Hide receipt lines that match their order and invoice")
+		}
+	],
+
+	formatter: function(value, row, column, data, default_formatter) {
+		value = default_formatter(value, row, column, data);
+		if (column.fieldname == "status" && data && data.status && data.status != "Matched") {
+			value = `<span style="color: var(--red-500)">${value}</span>`;
+		}
+		return value;
+	}
+};
@@ -0,0 +1,145 @@
+import frappe
+from frappe import _
+from frappe.utils import cint
+
+
+def execute(filters=None):
+    filters = frappe._dict(filters or {})
+    return get_columns(), get_data(filters)
+
+
+def get_columns():
+    columns = [
+        {"label": _("Date"), "fieldname": "date", "fieldtype": "Date", "width": 100},
+        {
+            "label": _("Purchase Receipt"),
+            "fieldname": "purchase_receipt",
+            "fieldtype": "Link",
+            "options": "Purchase Receipt",
+            "width": 150,
+        },
+        {
+            "label": _("Purchase Order"),
+            "fieldname": "purchase_order",
+            "fieldtype": "Link",
+            "options": "Purchase Order",
+            "width": 150,
+        },
+        {"label": _("Purchase Invoices"), "fieldname": "purchase_invoices", "fieldtype": "Data", "width": 200},
+        {"label": _("Supplier"), "fieldname": "supplier", "fieldtype": "Link", "options": "Supplier", "width": 160},
+        {"label": _("Item"), "fieldname": "item_code", "fieldtype": "Link", "options": "Item", "width": 180},
+    ]
+
+    for fieldname, label, fieldtype in (
+        ("ordered_qty", _("Ordered Qty"), "Float"),
+        ("received_qty", _("Received Qty"), "Float"),
+        ("order_received_qty", _("Received on Order (Stock Qty)"), "Float"),
+        ("billed_qty", _("Billed Qty"), "Float"),
+        ("po_rate", _("PO Rate"), "Currency"),
+        ("grn_rate", _("GRN Rate"), "Currency"),
+        ("invoice_rate", _("Invoice Rate"), "Currency"),
+        ("unbilled_qty", _("Unbilled Qty"), "Float"),
+        ("unbilled_amount", _("Unbilled Amount"), "Currency"),
+    ):
+        columns.append({"label": label, "fieldname": fieldname, "fieldtype": fieldtype, "width": 110})
+
+    columns.append({"label": _("Status"), "fieldname": "status", "fieldtype": "Data", "width": 120})
+    return columns
+
+
+def get_conditions(filters):
+    conditions = ""
+    if filters.get("supplier"):
+        conditions += " AND pr.supplier = %(supplier)s"
+    return conditions
+
+
+def get_data(filters):
+    """One row per receipt line, matched to its order line and its invoice lines.
+
+    Invoice lines are summed per receipt line (`pr_detail`) in a derived table
+    limited to the receipts in range, and order lines are joined on their primary
+    key, so every line is matched by set based joins rather than per row lookups.
+    Over-receipt is judged on everything received against the order line, in any
+    receipt and any period, since it can build up over several receipts. Return
+    receipts are not lines of their own; their negative quantities net into that
+    total instead.
+    Flags are worked out by the database as well, which lets Exceptions Only drop
+    the matched lines before they are sent back.
+    """
+    having = ""
+    if filters.get("status"):
+        having = "HAVING status = %(status)s"
+    elif filters.get("exceptions_only"):
+        having = "HAVING status != 'Matched'"
+
+    return frappe.db.sql(
+        """
+        SELECT
+            pr.posting_date AS date,
+            pri.parent AS purchase_receipt,
+            pri.purchase_order,
+            pb.purchase_invoices,
+            pr.supplier,
+            pri.item_code,
+            poi.qty AS ordered_qty,
+            pri.qty AS received_qty,
+            rcv.received_stock_qty AS order_received_qty,
+            COALESCE(pb.billed_qty, 0) AS billed_qty,
+            poi.rate AS po_rate,
+            pri.rate AS grn_rate,
+            pb.billed_rate AS invoice_rate,
+            pri.qty - COALESCE(pb.billed_qty, 0) AS unbilled_qty,
+            (pri.qty - COALESCE(pb.billed_qty, 0)) * pri.rate AS unbilled_amount,
+            CASE
+                WHEN poi.name IS NULL THEN 'No Order'
+                WHEN COALESCE(pb.billed_qty, 0) = 0 THEN 'Unbilled'
+                WHEN pb.billed_qty > pri.qty OR rcv.received_stock_qty > poi.stock_qty THEN 'Qty Mismatch'
+                WHEN ROUND(pri.rate, %(precision)s) != ROUND(poi.rate, %(precision)s)
+                    OR ROUND(pb.billed_rate, %(precision)s) != ROUND(pri.rate, %(precision)s) THEN 'Rate Mismatch'
+                WHEN pb.billed_qty < pri.qty THEN 'Partly Billed'
+                ELSE 'Matched'
+            END AS status
+        FROM `tabPurchase Receipt Item` pri
+        INNER JOIN `tabPurchase Receipt` pr ON pr.name = pri.parent
+        LEFT JOIN `tabPurchase Order Item` poi ON poi.name = pri.purchase_order_item
+        LEFT JOIN (
+            SELECT
+                pii.pr_detail,
+                SUM(pii.qty) AS billed_qty,
+                SUM(pii.amount) / NULLIF(SUM(pii.qty), 0) AS billed_rate,
+                GROUP_CONCAT(DISTINCT pii.parent ORDER BY pii.parent SEPARATOR ', ') AS purchase_invoices
+            FROM `tabPurchase Invoice Item` pii
+            INNER JOIN `tabPurchase Receipt` pr ON pr.name = pii.purchase_receipt
+            WHERE pii.docstatus = 1
+                AND pr.company = %(company)s
+                AND pr.posting_date BETWEEN %(from_date)s AND %(to_date)s
+                {conditions}
+            GROUP BY pii.pr_detail
+        ) pb ON pb.pr_detail = pri.name
+        LEFT JOIN (
+            SELECT all_pri.purchase_order_item, SUM(all_pri.stock_qty) AS received_stock_qty
+            FROM `tabPurchase Receipt Item` all_pri
+            WHERE all_pri.docstatus = 1
+                AND all_pri.purchase_order_item IN (
+                    SELECT pri.purchase_order_item
+                    FROM `tabPurchase Receipt Item` pri
+                    INNER JOIN `tabPurchase Receipt` pr ON pr.name = pri.parent
+                    WHERE pri.docstatus = 1
+                        AND pr.company = %(company)s
+                        AND pr.posting_date BETWEEN %(from_date)s AND %(to_date)s
+                        {conditions}
+                )
+            GROUP BY all_pri.purchase_order_item
+        ) rcv ON rcv.purchase_order_item = pri.purchase_order_item
+        WHERE pri.docstatus = 1
+            AND pr.is_return = 0
+            AND pr.company = %(company)s
+            AND pr.posting_date BETWEEN %(from_date)s AND %(to_date)s
+            {conditions}
+        {having}
+        ORDER BY pr.posting_date, pri.parent, pri.idx
+        """.format(conditions=get_conditions(filters), having=having),
+        dict(filters, precision=cint(frappe.db.get_default("currency_precision")) or 2),
+        as_dict=1,
+    )